@@ -1,13 +1,14 @@
 from pathlib import Path
-import random
 
 project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
+from src.q_table import QTable
+from src.sampling import EpsilonGreedySampler
 from src.plot_utils import plot_episode_stats
 
 class NStepSarsa:
-    def __init__(self, env, alpha, gamma, epsilon, n_steps):
+    def __init__(self, env, alpha, gamma, epsilon, n_steps, seed=None):
         self.env = env
 
         self.states = self.env.states
@@ -23,44 +24,25 @@ class NStepSarsa:
         self.n_episodes = 0
 
         self.state_values = {state: 0.0 for state in self.states}
-        self.qvalues = {state: {action: 0.0 for action in self.actions} for state in self.states}
-        self.policy_probs = {
-            state: {action: 1.0 / self.n_actions for action in self.actions}
-            for state in self.states
-        }
-        self.policy_probs[self.target_pos] = {action: 0.0 for action in self.actions}
-        self.policy_probs[self.target_pos][5] = 1.0
+        self.qvalues = QTable(self.env.n_states, self.n_actions)
+        self.sampler = EpsilonGreedySampler(self.n_actions, self.epsilon, seed)
 
         self.policy = {state: self.actions[0] for state in self.states}
         self.episode_lengths = []
         self.total_rewards = []
 
-    def _sample_action(self, state):
-        probs = self.policy_probs[state]
-        actions = list(probs.keys())
-        weights = [probs[action] for action in actions]
-        return random.choices(actions, weights=weights, k=1)[0]
-
-    def _update_epsilon_greedy_policy(self, state):
-        n_actions = len(self.actions)
-        max_q = max(self.qvalues[state].values())
-        best_actions = [action for action, q in self.qvalues[state].items() if q == max_q]
-        n_best = len(best_actions)
-
-        for action in self.actions:
-            self.policy_probs[state][action] = self.epsilon / n_actions
-        if n_best > 0:
-            add = (1.0 - self.epsilon) / n_best
-            for action in best_actions:
-                self.policy_probs[state][action] += add
+    def _sample_action(self, state_index):
+        # Epsilon-greedy on the current Q row; no per-state probability table to maintain.
+        return self.sampler.sample(self.qvalues.q[state_index])
 
     def solve(self, n_episodes, max_steps):
         self.n_episodes = n_episodes
 
+        q = self.qvalues.q
         for _ in range(n_episodes):
             step = 0
             reward_sum = 0.0
-            state_t = self.env.reset(self.start_pos)
+            state_t = self.env.state_to_index[self.env.reset(self.start_pos)]
             action_t = self._sample_action(state_t)
 
             states_list = [state_t]
@@ -70,7 +52,8 @@ class NStepSarsa:
 
             while not done and step < max_steps:
                 step += 1
-                state_t1, reward, done = self.env.step(action_t)
+                next_state, reward, done = self.env.step(self.actions[action_t])
+                state_t1 = self.env.state_to_index[next_state]
                 reward_sum += reward
                 states_list.append(state_t1)
                 rewards.append(reward)
@@ -81,7 +64,7 @@ class NStepSarsa:
                 tau = step - self.n_steps
                 if tau >= 0:
                     if not done:
-                        g_return = self.qvalues[states_list[step]][actions_list[step]]
+                        g_return = q[states_list[step], actions_list[step]]
                     else:
                         g_return = 0.0
 
@@ -90,8 +73,7 @@ class NStepSarsa:
 
                     state_tau = states_list[tau]
                     action_tau = actions_list[tau]
-                    self.qvalues[state_tau][action_tau] += self.alpha * (g_return - self.qvalues[state_tau][action_tau])
-                    self._update_epsilon_greedy_policy(state_tau)
+                    q[state_tau, action_tau] += self.alpha * (g_return - q[state_tau, action_tau])
 
                 state_t = state_t1
                 action_t = action_t1
@@ -99,9 +81,7 @@ class NStepSarsa:
             self.episode_lengths.append(step)
             self.total_rewards.append(reward_sum)
 
-        for state in self.states:
-            self.state_values[state] = max(self.qvalues[state].values())
-            self.policy[state] = max(self.qvalues[state], key=lambda action: self.qvalues[state][action])
+        self.state_values, self.policy = self.qvalues.to_value_and_policy(self.states, self.actions)
 
         self.env.render(self.state_values, self.policy, folder_path=str(project_root / "renders" / "n_step_sarsa"),
             title=f'n_episodes={self.n_episodes}, n={self.n_steps}, '
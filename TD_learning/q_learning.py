@@ -1,12 +1,13 @@
 from pathlib import Path
-import random
 
 project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
+from src.q_table import QTable
+from src.sampling import UniformStream
 
 class QLearning:
-    def __init__(self, env, alpha, gamma):
+    def __init__(self, env, alpha, gamma, seed=None):
         self.env = env
 
         self.states = self.env.states
@@ -17,36 +18,31 @@ class QLearning:
         self.start_pos = self.env.start_state
 
         n_actions = len(self.actions)
-        self.qvalues = {state: {action: 0.0 for action in self.actions} for state in self.states}
-        self.behavior_policy_probs = {
-            state: {action: 1.0 / n_actions for action in self.actions}
-            for state in self.states
-        }
+        self.qvalues = QTable(self.env.n_states, n_actions)
+        self.behavior_uniforms = UniformStream(seed)  # uniform behavior policy
         self.target_policy = {state: self.actions[0] for state in self.states}
         self.values = {state: 0.0 for state in self.states}
 
     def solve(self, n_episodes, episode_length):
+        q = self.qvalues.q
+        n_actions = len(self.actions)
         for _ in range(n_episodes):
-            state_t = self.env.reset(self.start_pos)
+            state_t = self.env.state_to_index[self.env.reset(self.start_pos)]
 
             for _ in range(episode_length):
-                probs = self.behavior_policy_probs[state_t]
-                actions = list(probs.keys())
-                weights = [probs[action] for action in actions]
-                action_t = random.choices(actions, weights=weights, k=1)[0]
+                action_t = self.behavior_uniforms.sample_uniform(n_actions)
 
-                state_t1, reward, _ = self.env.step(action_t)
+                next_state, reward, _ = self.env.step(self.actions[action_t])
+                state_t1 = self.env.state_to_index[next_state]
 
-                best_next_q = max(self.qvalues[state_t1][action] for action in self.actions)
-                self.qvalues[state_t][action_t] += self.alpha * (
-                    reward + self.gamma * best_next_q - self.qvalues[state_t][action_t]
+                best_next_q = q[state_t1].max()
+                q[state_t, action_t] += self.alpha * (
+                    reward + self.gamma * best_next_q - q[state_t, action_t]
                 )
-
-                self.target_policy[state_t] = max(self.qvalues[state_t], key=lambda action: self.qvalues[state_t][action])
                 state_t = state_t1
 
-        for state in self.states:
-            self.values[state] = self.qvalues[state][self.target_policy[state]]
+        # The greedy target policy only changes where Q changed, so extract it once.
+        self.values, self.target_policy = self.qvalues.to_value_and_policy(self.states, self.actions)
 
         self.env.render(self.values, self.target_policy, folder_path=str(project_root / "renders" / "q_learning"),
             title=f'n_episodes={n_episodes}, '
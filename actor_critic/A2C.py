@@ -10,6 +10,9 @@ project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
 from src.plot_utils import plot_loss
+from src.policy_extraction import evaluate_states, greedy_values_and_actions, to_state_dicts
+from src.state_encoder import StateEncoder
+from src.vector_grid_world import VectorGridWorld
 
 class A2C:
     def __init__(
@@ -21,8 +24,10 @@ class A2C:
         critic_lr,
         actor_net_size,
         critic_net_size,
+        state_encoding="coords",
     ) -> None:
         self.set_seed(seed)
+        self.seed = seed
 
         self.env = env
         self.start_pos = self.env.start_state
@@ -37,14 +42,15 @@ class A2C:
         self.critic_lr = critic_lr
 
         self.device = self.get_device()
+        self.encoder = StateEncoder(self.env, state_encoding, self.device)
         self.actor = nn.Sequential(
-            nn.Linear(2, actor_net_size),
+            nn.Linear(self.encoder.dim, actor_net_size),
             nn.ReLU(),
             nn.Linear(actor_net_size, self.n_actions)
         )
         self.actor.to(self.device)
         self.critic = nn.Sequential(
-            nn.Linear(2, critic_net_size),
+            nn.Linear(self.encoder.dim, critic_net_size),
             nn.ReLU(),
             nn.Linear(critic_net_size, 1)
         )
@@ -52,6 +58,7 @@ class A2C:
 
         self.actor_optimizer = torch.optim.Adam(self.actor.parameters(), lr=self.actor_lr)
         self.critic_optimizer = torch.optim.Adam(self.critic.parameters(), lr=self.critic_lr)
+        self.state_features = self.encoder.features
 
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         self.folder_path = str(project_root / "renders" / "A2C" / f"{self.timestamp}")
@@ -66,15 +73,6 @@ class A2C:
         print(f"Using device: {device}")
         return device
     
-    def state_to_tensor(self, state):
-        x_ = self.env.width - 1
-        y_ = self.env.height - 1
-
-        x, y = state
-        states_tensor = torch.tensor((x / x_, y / y_), dtype=torch.float32, device=self.device)
-
-        return states_tensor    
-
     def sample_action(self, state_tensor):
         """Sample an action index from the policy network given a state tensor."""
         action_probs = torch.softmax(self.actor(state_tensor), dim=-1)
@@ -107,7 +105,7 @@ class A2C:
         log_interval = max(1, n_episodes // 10)
         for ep in range(1, n_episodes + 1):
             state = self.start_pos
-            state_tensor = self.state_to_tensor(state)
+            state_tensor = self.encoder.encode(state)
             episode_log_probs = []
             episode_advantages = []
 
@@ -118,7 +116,7 @@ class A2C:
                 state_value = self.critic(state_tensor).squeeze(-1)
 
                 next_state, reward = self.env.get_next_state_and_reward(state, action)
-                next_state_tensor = self.state_to_tensor(next_state)
+                next_state_tensor = self.encoder.encode(next_state)
 
                 TD_target = torch.tensor(reward, device=self.device, dtype=torch.float32)
                 if self.env.is_target(next_state):
@@ -167,24 +165,25 @@ class A2C:
                     actor_loss_record.append(actor_loss_value)
             
             if ep % log_interval == 0:
-                actor_policy = {}
-                state_values = {}
-                for state in self.states:
-                    state_tensor = self.state_to_tensor(state)
-                    with torch.no_grad():
-                        actor_action = torch.argmax(self.actor(state_tensor)).item()
-                        state_value = self.critic(state_tensor)
-
-                    actor_policy[state] = self.actions[int(actor_action)]
-                    state_values[state] = state_value.item()
-
-                self.env.render(None, actor_policy,
-                                title=f"actor policy at episode {ep}",
-                                folder_path=self.folder_path,
-                                file_name=f"actor_policy_ep{ep}")
-                self.env.render(state_values, None, title=f"state values at episode {ep}",
-                                folder_path=self.folder_path,
-                                file_name=f"state_values_ep{ep}")
+                self._render("episode", ep)
+        self._plot_losses(critic_loss_record, actor_loss_record)
+
+    def _render(self, unit, count):
+        _, actor_actions = greedy_values_and_actions(self.actor, self.state_features)
+        critic_values = evaluate_states(self.critic, self.state_features).squeeze(-1).cpu().numpy()
+        _, actor_policy = to_state_dicts(self.env, action_indices=actor_actions)
+        state_values, _ = to_state_dicts(self.env, values=critic_values)
+
+        tag = "ep" if unit == "episode" else unit
+        self.env.render(None, actor_policy,
+                        title=f"actor policy at {unit} {count}",
+                        folder_path=self.folder_path,
+                        file_name=f"actor_policy_{tag}{count}")
+        self.env.render(state_values, None, title=f"state values at {unit} {count}",
+                        folder_path=self.folder_path,
+                        file_name=f"state_values_{tag}{count}")
+
+    def _plot_losses(self, critic_loss_record, actor_loss_record):
         plot_loss(
             critic_loss_record,
             title="critic loss",
@@ -200,6 +199,97 @@ class A2C:
             x_label="Update Step",
         )
 
+    def compute_gae(self, rewards, values, next_values, dones, truncated, gae_lambda):
+        """
+        Generalized advantage estimates for a [T, N] rollout of N lockstep envs.
+
+        `next_values` are V of the true successors, so a step that ends an
+        episode (done or truncated) still bootstraps correctly and the
+        recursion is cut there. gae_lambda=1 gives n-step returns
+        bootstrapped at the end of the rollout.
+
+        Returns: (advantages [T, N], returns [T, N])
+        """
+        not_done = 1.0 - dones
+        deltas = rewards + self.gamma * next_values * not_done - values
+        carry = not_done * (1.0 - truncated)
+
+        advantages = torch.zeros_like(rewards)
+        gae = torch.zeros_like(rewards[0])
+        for t in range(rewards.shape[0] - 1, -1, -1):
+            gae = deltas[t] + self.gamma * gae_lambda * carry[t] * gae
+            advantages[t] = gae
+        return advantages, advantages + values
+
+    def solve_sync(self, n_updates, n_envs, n_steps, gae_lambda, max_episode_length,
+                   value_coef=0.5, entropy_coef=0.0):
+        """
+        Synchronous multi-env A2C: `n_envs` copies step in lockstep for `n_steps`,
+        then one combined actor + critic update uses the whole [n_steps, n_envs] rollout.
+        """
+        vec_env = VectorGridWorld(
+            self.env, n_envs=n_envs, seed=self.seed, max_episode_length=max_episode_length
+        )
+        states = vec_env.reset()
+
+        shape = (n_steps, n_envs)
+        rollout_states = np.zeros(shape, dtype=np.int64)
+        rollout_actions = np.zeros(shape, dtype=np.int64)
+        rollout_next_states = np.zeros(shape, dtype=np.int64)
+        rollout_rewards = np.zeros(shape, dtype=np.float32)
+        rollout_dones = np.zeros(shape, dtype=np.float32)
+        rollout_truncated = np.zeros(shape, dtype=np.float32)
+
+        critic_loss_record = []
+        actor_loss_record = []
+        log_interval = max(1, n_updates // 10)
+        for update in range(1, n_updates + 1):
+            for t in range(n_steps):
+                with torch.no_grad():
+                    logits = self.actor(self.encoder(torch.from_numpy(states).to(self.device)))
+                    actions = torch.distributions.Categorical(logits=logits).sample().cpu().numpy()
+                next_states, rewards, dones = vec_env.step(actions)
+
+                rollout_states[t] = states
+                rollout_actions[t] = actions
+                rollout_next_states[t] = next_states
+                rollout_rewards[t] = rewards
+                rollout_dones[t] = dones
+                rollout_truncated[t] = vec_env.truncated
+                states = vec_env.current_states.copy()
+
+            def to_tensor(array):
+                return torch.from_numpy(array).to(self.device)
+
+            features = self.encoder(to_tensor(rollout_states))
+            values = self.critic(features).squeeze(-1)
+            with torch.no_grad():
+                next_values = self.critic(self.encoder(to_tensor(rollout_next_states))).squeeze(-1)
+            advantages, returns = self.compute_gae(
+                to_tensor(rollout_rewards), values.detach(), next_values,
+                to_tensor(rollout_dones), to_tensor(rollout_truncated), gae_lambda,
+            )
+
+            dist = torch.distributions.Categorical(logits=self.actor(features))
+            log_probs = dist.log_prob(to_tensor(rollout_actions))
+            normalized_advantages = (advantages - advantages.mean()) / (advantages.std(unbiased=False) + 1e-8)
+
+            actor_loss = -(log_probs * normalized_advantages).mean() - entropy_coef * dist.entropy().mean()
+            critic_loss = 0.5 * (returns - values).pow(2).mean()
+
+            self.actor_optimizer.zero_grad()
+            self.critic_optimizer.zero_grad()
+            (actor_loss + value_coef * critic_loss).backward()
+            self.actor_optimizer.step()
+            self.critic_optimizer.step()
+
+            actor_loss_record.append(actor_loss.item())
+            critic_loss_record.append(critic_loss.item())
+
+            if update % log_interval == 0:
+                self._render("update", update)
+        self._plot_losses(critic_loss_record, actor_loss_record)
+
 
 if __name__ == "__main__":
     config = {
@@ -221,6 +311,12 @@ if __name__ == "__main__":
         "actor_update_interval": 5,
         "max_episode_length": 50,
         "n_episodes": 10000,
+        "state_encoding": "coords",  # "coords", "one_hot", "fourier" or "tile"
+        "mode": "per_step",  # or "sync": lockstep envs, one update per rollout
+        "n_envs": 16,
+        "n_steps": 5,
+        "gae_lambda": 0.95,
+        "n_updates": 3000,
     }
 
     env = GridWorld(
@@ -244,9 +340,19 @@ if __name__ == "__main__":
         critic_lr=config["critic_lr"],
         actor_net_size=config["actor_net_size"],
         critic_net_size=config["critic_net_size"],
+        state_encoding=config["state_encoding"],
     )
-    a2c.solve(
-        n_episodes=config["n_episodes"],
-        actor_update_interval=config["actor_update_interval"],
-        max_episode_length=config["max_episode_length"],
-    )
\ No newline at end of file
+    if config["mode"] == "sync":
+        a2c.solve_sync(
+            n_updates=config["n_updates"],
+            n_envs=config["n_envs"],
+            n_steps=config["n_steps"],
+            gae_lambda=config["gae_lambda"],
+            max_episode_length=config["max_episode_length"],
+        )
+    else:
+        a2c.solve(
+            n_episodes=config["n_episodes"],
+            actor_update_interval=config["actor_update_interval"],
+            max_episode_length=config["max_episode_length"],
+        )
\ No newline at end of file
@@ -1,6 +1,7 @@
 from pathlib import Path
 from datetime import datetime
 import random
+import time
 
 import numpy as np
 import torch
@@ -9,7 +10,10 @@ import torch.nn as nn
 project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
-from src.plot_utils import plot_loss
+from src.plot_utils import plot_episode_stats, plot_loss
+from src.policy_extraction import greedy_values_and_actions, to_state_dicts
+from src.state_encoder import StateEncoder
+from src.vector_grid_world import VectorGridWorld
 
 class QAC:
     def __init__(
@@ -21,8 +25,10 @@ class QAC:
         critic_lr,
         actor_net_size,
         critic_net_size,
+        state_encoding="coords",
     ) -> None:
         self.set_seed(seed)
+        self.seed = seed
 
         self.env = env
         self.start_pos = self.env.start_state
@@ -37,14 +43,15 @@ class QAC:
         self.critic_lr = critic_lr
 
         self.device = self.get_device()
+        self.encoder = StateEncoder(self.env, state_encoding, self.device)
         self.actor = nn.Sequential(
-            nn.Linear(2, actor_net_size),
+            nn.Linear(self.encoder.dim, actor_net_size),
             nn.ReLU(),
             nn.Linear(actor_net_size, self.n_actions)
         )
         self.actor.to(self.device)
         self.critic = nn.Sequential(
-            nn.Linear(2, critic_net_size),
+            nn.Linear(self.encoder.dim, critic_net_size),
             nn.ReLU(),
             nn.Linear(critic_net_size, self.n_actions)
         )
@@ -52,6 +59,9 @@ class QAC:
 
         self.actor_optimizer = torch.optim.Adam(self.actor.parameters(), lr=self.actor_lr)
         self.critic_optimizer = torch.optim.Adam(self.critic.parameters(), lr=self.critic_lr)
+        self.state_features = self.encoder.features
+        self.episode_lengths = []
+        self.total_rewards = []
 
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         self.folder_path = str(project_root / "renders" / "QAC" / 
@@ -67,15 +77,6 @@ class QAC:
         print(f"Using device: {device}")
         return device
     
-    def state_to_tensor(self, state):
-        x_ = self.env.width - 1
-        y_ = self.env.height - 1
-
-        x, y = state
-        states_tensor = torch.tensor((x / x_, y / y_), dtype=torch.float32, device=self.device)
-
-        return states_tensor    
-
     def sample_action(self, state_tensor):
         """Sample an action index from the policy network given a state tensor."""
         action_probs = torch.softmax(self.actor(state_tensor), dim=-1)
@@ -89,12 +90,14 @@ class QAC:
         if not log_probs:
             return None
 
-        advantages_tensor = torch.stack(advantages)
+        return self._actor_step(torch.stack(log_probs), torch.stack(advantages))
+
+    def _actor_step(self, log_probs, advantages_tensor):
         adv_mean = advantages_tensor.mean()
         adv_std = advantages_tensor.std(unbiased=False)
         normalized_advantages = (advantages_tensor - adv_mean) / (adv_std + 1e-8)
 
-        actor_loss = -torch.stack(log_probs) * normalized_advantages
+        actor_loss = -log_probs * normalized_advantages
         actor_loss = actor_loss.mean()
 
         self.actor_optimizer.zero_grad()
@@ -102,15 +105,77 @@ class QAC:
         self.actor_optimizer.step()
         return actor_loss.item()
 
-    def solve(self, n_episodes, actor_update_interval, max_episode_length):
+    def solve(self, n_episodes, actor_update_interval, max_episode_length, batched=False, rollout_length=32,
+              n_envs=8):
+        """
+        Per-step mode updates the critic after every transition and the actor every
+        `actor_update_interval` steps. `batched` mode steps `n_envs` env copies in
+        lockstep, collects `rollout_length` steps of each into a buffer and does one
+        critic and one actor update on it. Both report their throughput and record
+        every episode's length and return in `episode_lengths` / `total_rewards`.
+        """
+        start = time.perf_counter()
+        if batched:
+            critic_loss_record, actor_loss_record, n_transitions = self._solve_batched(
+                n_episodes, max_episode_length, rollout_length, n_envs
+            )
+        else:
+            critic_loss_record, actor_loss_record, n_transitions = self._solve_per_step(
+                n_episodes, actor_update_interval, max_episode_length
+            )
+        elapsed = time.perf_counter() - start
+
+        mode = "batched" if batched else "per-step"
+        print(f"QAC ({mode}): {n_transitions} transitions, {len(critic_loss_record)} critic updates "
+              f"in {elapsed:.2f}s ({n_transitions / elapsed:.0f} transitions/s)")
+
+        plot_loss(
+            critic_loss_record,
+            title="critic loss",
+            out_dir=self.folder_path,
+            file_name="critic_loss",
+            x_label="Update Step",
+        )
+        plot_loss(
+            actor_loss_record,
+            title="actor loss",
+            out_dir=self.folder_path,
+            file_name="actor_loss",
+            x_label="Update Step",
+        )
+        plot_episode_stats(
+            self.episode_lengths,
+            self.total_rewards,
+            out_dir=self.folder_path,
+            x_label="Episode",
+        )
+
+    def _render(self, ep):
+        _, actor_actions = greedy_values_and_actions(self.actor, self.state_features)
+        _, actor_policy = to_state_dicts(self.env, action_indices=actor_actions)
+        state_values, critic_policy = to_state_dicts(
+            self.env, *greedy_values_and_actions(self.critic, self.state_features)
+        )
+
+        self.env.render(None, actor_policy,
+                        title=f"actor policy at episode {ep}",
+                        folder_path=self.folder_path,
+                        file_name=f"actor_policy_ep{ep}")
+        self.env.render(state_values, critic_policy, title=f"critic policy at episode {ep}",
+                        folder_path=self.folder_path,
+                        file_name=f"critic_policy_ep{ep}")
+
+    def _solve_per_step(self, n_episodes, actor_update_interval, max_episode_length):
         critic_loss_record = []
         actor_loss_record = []
+        n_transitions = 0
         log_interval = max(1, n_episodes // 10)
         for ep in range(1, n_episodes + 1):
             state = self.start_pos
-            state_tensor = self.state_to_tensor(state)
+            state_tensor = self.encoder.encode(state)
             episode_log_probs = []
             episode_advantages = []
+            reward_sum = 0.0
 
             done = False
             for step in range(max_episode_length):
@@ -119,7 +184,8 @@ class QAC:
                 critic_value = self.critic(state_tensor)[action_index]
 
                 next_state, reward = self.env.get_next_state_and_reward(state, action)
-                next_state_tensor = self.state_to_tensor(next_state)
+                reward_sum += reward
+                next_state_tensor = self.encoder.encode(next_state)
 
                 TD_target = torch.tensor(reward, device=self.device, dtype=torch.float32)
                 if self.env.is_target(next_state):
@@ -153,11 +219,14 @@ class QAC:
                     episode_advantages = []
 
                 critic_loss_record.append(critic_loss.item())
+                n_transitions += 1
 
                 if done:
                     break
                 state = next_state
                 state_tensor = next_state_tensor
+            self.episode_lengths.append(step + 1)
+            self.total_rewards.append(reward_sum)
 
             # Update actor with normalized advantages over the whole episode.
             if episode_log_probs:
@@ -169,42 +238,94 @@ class QAC:
                     actor_loss_record.append(actor_loss_value)
             
             if ep % log_interval == 0:
-                actor_policy = {}
-                critic_policy = {}
-                state_values = {}
-                for state in self.states:
-                    state_tensor = self.state_to_tensor(state)
-                    with torch.no_grad():
-                        actor_action = torch.argmax(self.actor(state_tensor)).item()
-                        critic_qvalues = self.critic(state_tensor)
-                        critic_action = torch.argmax(critic_qvalues).item()
-
-                    actor_policy[state] = self.actions[int(actor_action)]
-                    critic_policy[state] = self.actions[int(critic_action)]
-                    state_values[state] = critic_qvalues.max().item()
-
-                self.env.render(None, actor_policy,
-                                title=f"actor policy at episode {ep}",
-                                folder_path=self.folder_path,
-                                file_name=f"actor_policy_ep{ep}")
-                self.env.render(state_values, critic_policy, title=f"critic policy at episode {ep}",
-                                folder_path=self.folder_path,
-                                file_name=f"critic_policy_ep{ep}")
-        plot_loss(
-            critic_loss_record,
-            title="critic loss",
-            out_dir=self.folder_path,
-            file_name="critic_loss",
-            x_label="Update Step",
-        )
-        plot_loss(
-            actor_loss_record,
-            title="actor loss",
-            out_dir=self.folder_path,
-            file_name="actor_loss",
-            x_label="Update Step",
-        )
+                self._render(ep)
+        return critic_loss_record, actor_loss_record, n_transitions
+
+    def _solve_batched(self, n_episodes, max_episode_length, rollout_length, n_envs):
+        """
+        `n_envs` copies of the env step in lockstep on a VectorGridWorld and each
+        rollout holds `rollout_length` steps of every copy. The actor is fixed
+        within a rollout, so pi(.|s) for every state comes from one forward; the
+        critic's SARSA targets use a' ~ pi(.|s').
+
+        Collection stops at the step that ends the `n_episodes`-th episode, so
+        the last rollout may be shorter, and policies are only rendered after an
+        update, never from a half-updated rollout.
+        """
+        vec_env = VectorGridWorld(self.env, n_envs=n_envs, seed=self.seed, max_episode_length=max_episode_length)
+        states = vec_env.reset()
+
+        rollout_states = np.zeros((rollout_length, n_envs), dtype=np.int64)
+        rollout_actions = np.zeros((rollout_length, n_envs), dtype=np.int64)
+        rollout_rewards = np.zeros((rollout_length, n_envs), dtype=np.float32)
+        rollout_next_states = np.zeros((rollout_length, n_envs), dtype=np.int64)
+        rollout_dones = np.zeros((rollout_length, n_envs), dtype=np.float32)
+        episode_lengths = np.zeros(n_envs, dtype=np.int64)
+        episode_rewards = np.zeros(n_envs, dtype=np.float64)
+
+        def to_tensor(array):
+            return torch.from_numpy(np.ascontiguousarray(array)).to(self.device)
 
+        critic_loss_record = []
+        actor_loss_record = []
+        n_transitions = 0
+        log_interval = max(1, n_episodes // 10)
+        next_render = log_interval
+        ep = 0
+        while ep < n_episodes:
+            with torch.no_grad():
+                action_probs = torch.softmax(self.actor(self.state_features), dim=-1).cpu().numpy().astype(np.float64)
+
+            t = 0
+            while t < rollout_length and ep < n_episodes:
+                actions = vec_env.policy_actions(action_probs, states)
+                next_states, rewards, dones = vec_env.step(actions)
+                rollout_states[t] = states
+                rollout_actions[t] = actions
+                rollout_rewards[t] = rewards
+                rollout_next_states[t] = next_states
+                rollout_dones[t] = dones
+                states = vec_env.current_states.copy()
+                t += 1
+
+                episode_lengths += 1
+                episode_rewards += rewards
+                finished = np.flatnonzero(dones | vec_env.truncated)[:n_episodes - ep]
+                self.episode_lengths.extend(episode_lengths[finished].tolist())
+                self.total_rewards.extend(episode_rewards[finished].tolist())
+                episode_lengths[finished] = 0
+                episode_rewards[finished] = 0.0
+                ep += finished.size
+            n_transitions += t * n_envs
+
+            s = to_tensor(rollout_states[:t].reshape(-1))
+            a = to_tensor(rollout_actions[:t].reshape(-1))
+            next_s = rollout_next_states[:t].reshape(-1)
+            next_actions = to_tensor(vec_env.policy_actions(action_probs, next_s))
+            with torch.no_grad():
+                next_q = self.critic(self.encoder(to_tensor(next_s)))
+                next_q = next_q.gather(1, next_actions.unsqueeze(1)).squeeze(1)
+                TD_target = (to_tensor(rollout_rewards[:t].reshape(-1))
+                             + self.gamma * next_q * (1.0 - to_tensor(rollout_dones[:t].reshape(-1))))
+
+            critic_values = self.critic(self.encoder(s)).gather(1, a.unsqueeze(1)).squeeze(1)
+            advantages = TD_target - critic_values
+            critic_loss = 0.5 * advantages.pow(2).mean()
+
+            # Update critic
+            self.critic_optimizer.zero_grad()
+            critic_loss.backward()
+            self.critic_optimizer.step()
+            critic_loss_record.append(critic_loss.item())
+
+            log_probs = torch.distributions.Categorical(logits=self.actor(self.encoder(s))).log_prob(a)
+            actor_loss_record.append(self._actor_step(log_probs, advantages.detach()))
+
+            if ep >= next_render:
+                self._render(ep)
+                next_render = (ep // log_interval + 1) * log_interval
+
+        return critic_loss_record, actor_loss_record, n_transitions
 
 if __name__ == "__main__":
     config = {
@@ -226,6 +347,10 @@ if __name__ == "__main__":
         "actor_update_interval": 5,
         "max_episode_length": 30,
         "n_episodes": 10000,
+        "state_encoding": "coords",  # "coords", "one_hot", "fourier" or "tile"
+        "batched": False,  # True: rollout buffer with one critic / actor update per rollout
+        "rollout_length": 32,
+        "n_envs": 8,
     }
 
     env = GridWorld(
@@ -249,9 +374,13 @@ if __name__ == "__main__":
         critic_lr=config["critic_lr"],
         actor_net_size=config["actor_net_size"],
         critic_net_size=config["critic_net_size"],
+        state_encoding=config["state_encoding"],
     )
     qac.solve(
         n_episodes=config["n_episodes"],
         actor_update_interval=config["actor_update_interval"],
         max_episode_length=config["max_episode_length"],
+        batched=config["batched"],
+        rollout_length=config["rollout_length"],
+        n_envs=config["n_envs"],
     )
\ No newline at end of file
@@ -0,0 +1,90 @@
+import time
+
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from src.batching import TensorBatches
+from src.grid_world import GridWorld
+from value_funtion_methods.DQN import DQN
+
+
+def run_epochs(dqn, batches, n_epochs):
+    """
+    Train `dqn` for `n_epochs` passes over `batches`.
+
+    Returns: updates per second
+    """
+    n_updates = 0
+    start = time.perf_counter()
+    for _ in range(n_epochs):
+        for s, a_index, r, ns, done in batches:
+            s, a_index, r, ns, done = (t.to(dqn.device) for t in (s, a_index, r, ns, done))
+            dqn._update(s, a_index, r, ns, done)
+            n_updates += 1
+    if dqn.device.type == "cuda":
+        torch.cuda.synchronize()
+    return n_updates / (time.perf_counter() - start)
+
+
+def benchmark(env, config):
+    """Updates/sec of DQN's offline training loop fed by a DataLoader vs `TensorBatches`."""
+    dqn = DQN(env=env, **config["dqn"])
+    tensors = tuple(t.cpu() for t in dqn.episodes_to_tensors(dqn._collect_dataset()))
+
+    loaders = {
+        "DataLoader": DataLoader(TensorDataset(*tensors), batch_size=dqn.batch_size, shuffle=True),
+        "TensorBatches": TensorBatches(tensors, dqn.batch_size, device=dqn.device),
+    }
+    if dqn.device.type == "cuda":
+        loaders["TensorBatches (pinned)"] = TensorBatches(tensors, dqn.batch_size, device=dqn.device, pin_memory=True)
+
+    results = {}
+    for name, batches in loaders.items():
+        run_epochs(dqn, batches, 1)  # warm-up
+        results[name] = run_epochs(dqn, batches, config["n_epochs"])
+    return results
+
+
+if __name__ == "__main__":
+    config = {
+        "grid_size": 5,
+        "start_pos": (0, 0),
+        "target_pos": (2, 3),
+        "forbidden_cells": [(1, 1), (1, 3), (1, 4), (2, 1), (2, 2), (3, 3)],
+        "r_target": 1,
+        "r_boundary": -3,
+        "r_forbidden": -3,
+        "r_step": -0.05,
+        "r_stay": -0.1,
+        "n_epochs": 5,
+        "dqn": {
+            "seed": 42,
+            "hidden_size": 100,
+            "lr": 4e-3,
+            "n_replay_episodes": 200,
+            "replay_episode_max_length": 1000,
+            "batch_size": 32,
+            "n_epochs": 1,
+            "discount_factor": 0.9,
+            "target_update_freq": 20,
+            "bootstrap_terminal": True,
+        },
+    }
+
+    env = GridWorld(
+        width=config["grid_size"],
+        height=config["grid_size"],
+        target=config["target_pos"],
+        forbidden=config["forbidden_cells"],
+        start=config["start_pos"],
+        r_target=config["r_target"],
+        r_boundary=config["r_boundary"],
+        r_forbidden=config["r_forbidden"],
+        r_step=config["r_step"],
+        r_stay=config["r_stay"],
+    )
+
+    results = benchmark(env, config)
+    baseline = results["DataLoader"]
+    for name, updates_per_sec in results.items():
+        print(f"{name:>24}: {updates_per_sec:10.1f} updates/s  ({updates_per_sec / baseline:.2f}x)")
@@ -1,9 +1,14 @@
 from pathlib import Path
+
+import numpy as np
+
 project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
 
 class PolicyIteration:
+    EVALUATION_METHODS = ("iterative", "modified", "direct", "krylov", "doubling")
+
     def __init__(
         self,
         env,
@@ -19,52 +24,153 @@ class PolicyIteration:
         self.values = {state: 0.0 for state in self.states}  # Initialize value
         self.policy = {state: self.actions[0] for state in self.states}  # Initialize policy
 
-    def solve(self, max_improvement_steps, max_evaluation_steps, threshold):
-
-        self.values = {state: 0.0 for state in self.states}  # Initialize value
+    def solve(self, max_improvement_steps, max_evaluation_steps, threshold, evaluation="iterative"):
+        """
+        Policy iteration on the GridWorld tables.
+
+        `evaluation` selects how V^pi is computed:
+          - "iterative": up to `max_evaluation_steps` truncated Bellman sweeps.
+          - "modified": asynchronous modified policy iteration; each of up to
+            `max_evaluation_steps` rounds backs up only dirty states (policy changed,
+            or a successor moved by more than `threshold`), warm-started from V.
+            It converges like "iterative": once a backup of every state moves
+            none by `threshold` or more.
+          - "direct": sparse LU solve of (I - gamma P_pi) V = R_pi.
+          - "krylov": BiCGSTAB on the same system, warm-started from the previous V
+            and capped at `max_evaluation_steps` iterations.
+          - "doubling": exact solve exploiting the single successor per state by
+            pointer doubling; no scipy needed.
+        """
+        if evaluation not in self.EVALUATION_METHODS:
+            raise ValueError(f"Invalid evaluation {evaluation}. Valid methods: {list(self.EVALUATION_METHODS)}")
+
+        next_state_index = self.env.next_state_index
+        reward = self.env.reward
+        rows = np.arange(self.env.n_states)
+        policy = np.array([self.env.action_to_index[self.policy[state]] for state in self.states], dtype=np.int64)
+        v = np.zeros(self.env.n_states)  # Initialize value
+        dirty = np.ones(self.env.n_states, dtype=bool)
 
         # Policy iteration
         improvement_iterations = max_improvement_steps
         for it_pi in range(1, max_improvement_steps + 1):
+            next_pi = next_state_index[rows, policy]
+            reward_pi = reward[rows, policy]
+
             # Policy evaluation
-            evaluation_converged = False
-            for _ in range(max_evaluation_steps):
-                v_t1 = {state: 0.0 for state in self.states}
-                for state in self.states:
-                    action = self.policy[state]
-                    next_state, reward = self.env.get_next_state_and_reward(state, action)
-                    v_t1[state] = reward + self.gamma * self.values[next_state]
-
-                delta = max(abs(self.values[s] - v_t1[s]) for s in self.values)
-                self.values = v_t1
-                if delta < threshold:
-                    evaluation_converged = True
-                    break
+            if evaluation == "iterative":
+                evaluation_converged = False
+                for _ in range(max_evaluation_steps):
+                    v_t1 = reward_pi + self.gamma * v[next_pi]
+                    delta = np.abs(v - v_t1).max()
+                    v = v_t1
+                    if delta < threshold:
+                        evaluation_converged = True
+                        break
+            elif evaluation == "modified":
+                evaluation_converged, dirty = self._evaluate_modified(
+                    next_pi, reward_pi, v, dirty, max_evaluation_steps, threshold
+                )
+            elif evaluation == "doubling":
+                v, evaluation_converged = self._evaluate_doubling(next_pi, reward_pi), True
+            else:
+                v, evaluation_converged = self._evaluate_sparse(
+                    next_pi, reward_pi, v, evaluation, max_evaluation_steps, threshold
+                )
 
             # Policy improvement
-            policy_stable = True
-            for state in self.states:
-                old_action = self.policy[state]
-                qvalues = {action: 0.0 for action in self.actions}
-                for action in self.actions:
-                    next_state, reward = self.env.get_next_state_and_reward(state, action)
-                    qvalues[action] = reward + self.gamma * self.values[next_state]
-
-                self.policy[state] = max(qvalues, key=lambda action: qvalues[action])
-                if old_action != self.policy[state]:
-                    policy_stable = False
+            new_policy = (reward + self.gamma * v[next_state_index]).argmax(axis=1)
+            policy_changed = new_policy != policy
+            policy_stable = not policy_changed.any()
+            dirty |= policy_changed
+            policy = new_policy
 
             # Avoid early stop when policy appears stable under under-evaluated values.
             if policy_stable and evaluation_converged:
                 improvement_iterations = it_pi
                 break
 
+        self.values = dict(zip(self.states, v.tolist()))
+        self.policy = {state: self.actions[j] for state, j in zip(self.states, policy.tolist())}
+
         self.env.render(self.values, self.policy, folder_path=str(project_root / 'renders' / 'policy_iteration'),
                 title=f'policy_improvement_steps={improvement_iterations}, '
                 +f'policy_evaluation_steps={max_evaluation_steps}, '
                 +f'gamma={self.gamma}'
                 )
 
+    def _evaluate_modified(self, next_pi, reward_pi, v, dirty, max_evaluation_steps, threshold):
+        """
+        Back up only dirty states, updating `v` in place.
+
+        A state is re-dirtied when its successor under pi changed by more than
+        `threshold`, so converged regions of the map cost nothing. The residuals
+        dropped that way can still add up to about threshold / (1 - gamma), so an
+        empty dirty set only triggers a backup of every state; evaluation has
+        converged once that full backup moves no state by `threshold` or more.
+
+        Returns: (converged, dirty)
+        """
+        for _ in range(max_evaluation_steps):
+            full_check = not dirty.any()
+            idx = np.arange(self.env.n_states) if full_check else np.flatnonzero(dirty)
+
+            v_new = reward_pi[idx] + self.gamma * v[next_pi[idx]]
+            residual = np.abs(v_new - v[idx])
+            v[idx] = v_new
+            if full_check and residual.max() < threshold:
+                return True, np.zeros(self.env.n_states, dtype=bool)
+
+            changed = np.zeros(self.env.n_states, dtype=bool)
+            changed[idx[residual > threshold]] = True
+            dirty = changed[next_pi]
+
+        return False, dirty
+
+    def _evaluate_doubling(self, next_pi, reward_pi):
+        """
+        Unroll V[s] = R_pi[s] + gamma * V[next_pi[s]] by pointer doubling.
+
+        After k rounds V[s] = acc[s] + disc[s] * V[ptr[s]] with disc = gamma^(2^k),
+        so O(log log eps) vectorized rounds reach machine precision.
+        """
+        if not 0.0 <= self.gamma < 1.0:
+            raise ValueError(f"doubling evaluation requires 0 <= gamma < 1, got {self.gamma}")
+
+        acc = reward_pi.astype(np.float64)
+        disc = np.full(self.env.n_states, self.gamma, dtype=np.float64)
+        ptr = next_pi.copy()
+        while disc.max() > np.finfo(np.float64).eps:
+            acc = acc + disc * acc[ptr]
+            disc = disc * disc[ptr]
+            ptr = ptr[ptr]
+        return acc
+
+    def _evaluate_sparse(self, next_pi, reward_pi, v, evaluation, max_evaluation_steps, threshold):
+        """
+        Solve (I - gamma P_pi) V = R_pi, where P_pi has a single 1 per row.
+
+        Returns: (V, converged)
+        """
+        try:
+            import scipy.sparse as sp
+            import scipy.sparse.linalg as spla
+        except ImportError as exc:
+            raise RuntimeError("scipy is required for sparse policy evaluation; please install it (pip install scipy)") from exc
+
+        n_states = self.env.n_states
+        p_pi = sp.csr_matrix(
+            (np.ones(n_states), next_pi, np.arange(n_states + 1)),
+            shape=(n_states, n_states),
+        )
+        system = (sp.identity(n_states, format="csr") - self.gamma * p_pi).tocsc()
+
+        if evaluation == "direct":
+            return spla.spsolve(system, reward_pi), True
+
+        v_new, info = spla.bicgstab(system, reward_pi, x0=v, atol=threshold, maxiter=max_evaluation_steps)
+        return v_new, info == 0
+
 
 if __name__ == "__main__":
     config = {
@@ -80,6 +186,7 @@ if __name__ == "__main__":
         "threshold": 1e-4,
         "max_evaluation_steps": 20,
         "max_improvement_steps": 20,
+        "evaluation": "iterative",
     }
 
     env = GridWorld(
@@ -102,4 +209,5 @@ if __name__ == "__main__":
         max_improvement_steps=config["max_improvement_steps"],
         max_evaluation_steps=config["max_evaluation_steps"],
         threshold=config["threshold"],
+        evaluation=config["evaluation"],
     )
\ No newline at end of file
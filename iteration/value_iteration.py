@@ -1,9 +1,14 @@
 from pathlib import Path
+
+import numpy as np
+
 project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
 
 class ValueIteration:
+    UPDATE_ORDERS = ("synchronous", "gauss_seidel", "dirty_set")
+
     def __init__(
         self,
         env,
@@ -19,35 +24,92 @@ class ValueIteration:
         self.values = {state: 0.0 for state in self.states}  # Initialize value
         self.policy = {state: self.actions[0] for state in self.states}  # Initialize policy
         
-    def solve(self, max_iterations, threshold):
+    def solve(self, max_iterations, threshold, update_order="synchronous"):
+        """
+        Value iteration in matrix form: Q = R + gamma * V[next_state_index].
+
+        `update_order` selects the sweep:
+          - "synchronous": Jacobi update of every state from the previous V.
+          - "gauss_seidel": in-place update one grid column at a time, so later
+            columns already see the new values; the direction alternates per sweep.
+            On these grids it needs as many sweeps as "synchronous": the
+            target's own value only contracts by gamma per backup and bounds
+            the residual, whatever the order. Each sweep costs one NumPy call
+            per column, so it is slower than "synchronous" on large grids.
+          - "dirty_set": asynchronous sweep that backs up, in place, only the
+            states with a successor that changed in the previous sweep; all
+            other states have zero Bellman residual. States are not ordered
+            by residual, so this is not prioritized sweeping.
+        """
+        if update_order not in self.UPDATE_ORDERS:
+            raise ValueError(f"Invalid update_order {update_order}. Valid orders: {list(self.UPDATE_ORDERS)}")
+
+        next_state_index = self.env.next_state_index
+        reward = self.env.reward
+        v = np.zeros(self.env.n_states)  # Initialize value
+        dirty = np.ones(self.env.n_states, dtype=bool)
 
-        self.values = {state: 0.0 for state in self.states}  # Initialize value
-        
         # Value iteration
         iterations = max_iterations
         for it in range(1, max_iterations + 1):
-            v_t1 = {state: 0.0 for state in self.states}  # Initialize new value
-            for state in self.states:
-                qvalues = {action: 0.0 for action in self.actions}  # Initialize q-values
-                for action in self.actions:
-                    next_state, reward = self.env.get_next_state_and_reward(state, action)
-                    qvalues[action] = reward + self.gamma * self.values[next_state]
-
-                self.policy[state] = max(qvalues, key=lambda action: qvalues[action])
-                v_t1[state] = qvalues[self.policy[state]]
+            if update_order == "synchronous":
+                v_t1 = (reward + self.gamma * v[next_state_index]).max(axis=1)
+                delta = np.abs(v_t1 - v).max()
+                v = v_t1
+            elif update_order == "gauss_seidel":
+                delta = self._gauss_seidel_sweep(v, reverse=(it % 2 == 0))
+            else:
+                delta, dirty = self._dirty_set_sweep(v, dirty)
 
             # Check for convergence
-            delta = max(abs(self.values[s] - v_t1[s]) for s in self.values)
-            self.values = v_t1
             if delta < threshold:
                 iterations = it
                 break
 
+        qvalues = reward + self.gamma * v[next_state_index]
+        greedy = qvalues.argmax(axis=1)
+        self.values = dict(zip(self.states, v.tolist()))
+        self.policy = {state: self.actions[j] for state, j in zip(self.states, greedy.tolist())}
+
         self.env.render(self.values, self.policy, folder_path=str(project_root / 'renders' / 'value_iteration'),
             title=f'iteration={iterations}, '
             +f'gamma={self.gamma}'
             )
 
+    def _gauss_seidel_sweep(self, v, reverse=False):
+        """In-place sweep over blocks of one grid column (states are x-major)."""
+        next_state_index = self.env.next_state_index
+        reward = self.env.reward
+        block = self.env.height
+
+        starts = range(0, self.env.n_states, block)
+        if reverse:
+            starts = reversed(starts)
+
+        delta = 0.0
+        for lo in starts:
+            hi = lo + block
+            v_block = (reward[lo:hi] + self.gamma * v[next_state_index[lo:hi]]).max(axis=1)
+            delta = max(delta, float(np.abs(v_block - v[lo:hi]).max()))
+            v[lo:hi] = v_block
+        return delta
+
+    def _dirty_set_sweep(self, v, dirty):
+        """Back up only `dirty` states in place; return (delta, next dirty mask)."""
+        next_state_index = self.env.next_state_index
+        idx = np.flatnonzero(dirty)
+        if idx.size == 0:
+            return 0.0, dirty
+
+        v_new = (self.env.reward[idx] + self.gamma * v[next_state_index[idx]]).max(axis=1)
+        residual = np.abs(v_new - v[idx])
+        v[idx] = v_new
+
+        changed = np.zeros(self.env.n_states, dtype=bool)
+        changed[idx[residual > 0.0]] = True
+        # Predecessors of changed states are the only ones whose backup can differ.
+        return float(residual.max()), changed[next_state_index].any(axis=1)
+
 if __name__ == "__main__":
     config = {
         "grid_size": 5,
@@ -61,6 +123,7 @@ if __name__ == "__main__":
         "gamma": 0.9,
         "threshold": 1e-4,
         "max_iterations": 100,
+        "update_order": "synchronous",
     }
 
     env = GridWorld(
@@ -82,4 +145,5 @@ if __name__ == "__main__":
     vi.solve(
         max_iterations=config["max_iterations"],
         threshold=config["threshold"],
+        update_order=config["update_order"],
         )
@@ -1,11 +1,18 @@
 from pathlib import Path
+
+import numpy as np
+
 project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
+from src.q_table import QTable
+from src.episode_pool import EpisodePool
+from src.rollout_cache import RolloutCache
 
 class MCBasic:
-    def __init__(self, env, gamma):
+    def __init__(self, env, gamma, seed=None, n_workers=0):
         self.env = env
+        self.episode_pool = EpisodePool(env, n_workers, seed)
 
         self.states = self.env.states
         self.actions = self.env.actions
@@ -14,44 +21,71 @@ class MCBasic:
 
         self.policy = {state: self.actions[0] for state in self.states}  # Initialize policy
         self.values = {state: 0.0 for state in self.states}  # Initialize value
-        self.total_return = {(state, action): 0.0 for state in self.states for action in self.actions}
-        self.return_counts = {(state, action): 0 for state in self.states for action in self.actions}
-
-    def calculate_returns(self, episode):
-        discounted_return = 0.0
-        for _, _, reward_t, _, _ in reversed(episode):
-            discounted_return = self.gamma * discounted_return + reward_t
-        return discounted_return
-
-    def solve(self, max_iterations, threshold, n_episodes, episode_length):
-        iterations = max_iterations
-        for it in range(1, max_iterations + 1):
-            old_values = self.values.copy()
-            old_policy = self.policy.copy()
-
-            # Generate episodes starting from all state-action pairs
-            for state in self.states:
-                qvalues = {action: float('-inf') for action in self.actions}
-                for action in self.actions:
-                    for _ in range(n_episodes):
-                        episode = self.env.generate_deterministic_episode(state, self.policy, episode_length, action=action)
-                        discounted_return = self.calculate_returns(episode)
-                        self.total_return[(state, action)] += discounted_return
-                        self.return_counts[(state, action)] += 1
-
-                    if self.return_counts[(state, action)] > 0:
-                        qvalues[action] = self.total_return[(state, action)] / self.return_counts[(state, action)]
-
-                # policy improvement
-                self.policy[state] = max(qvalues, key=lambda act: qvalues[act])
-                self.values[state] = qvalues[self.policy[state]]
-
-            # Check for convergence
-            if old_policy == self.policy:
-                delta = max(abs(old_values[s] - self.values[s]) for s in self.values)
-                if delta < threshold:
-                    iterations = it
-                    break
+        self.qvalues = QTable(self.env.n_states, len(self.actions))
+        self.total_return = np.zeros((self.env.n_states, len(self.actions)))
+        self.return_counts = np.zeros((self.env.n_states, len(self.actions)), dtype=np.int64)
+
+    def _add_returns(self, states, episode_returns, n_episodes):
+        """Add `n_episodes` copies of each rollout return and refresh Q of `states`."""
+        self.total_return[states] += n_episodes * episode_returns
+        self.return_counts[states] += n_episodes
+        counts = self.return_counts[states]
+        self.qvalues[states] = np.where(counts > 0, self.total_return[states] / np.maximum(counts, 1), -np.inf)
+
+    def solve(self, max_iterations, threshold, n_episodes, episode_length, in_place=True):
+        """
+        MC Basic policy iteration from every state-action pair.
+
+        With `in_place` (the default) each state's policy is improved as soon as
+        its returns are in, so later states of the same sweep are evaluated under
+        it. `in_place=False` evaluates all pairs under the sweep's starting policy
+        and improves every state at once, which batches all rollouts of a sweep.
+        """
+        policy = np.array([self.env.action_to_index[self.policy[state]] for state in self.states], dtype=np.int64)
+        values = np.array([self.values[state] for state in self.states], dtype=np.float64)
+
+        # Deterministic env and policy: the n_episodes rollouts of a pair are identical,
+        # and a pair's return only changes when its trajectory meets a changed action.
+        self.rollout_cache = RolloutCache(
+            self.episode_pool.vec_env, self.gamma, episode_length, episodes=self.episode_pool
+        )
+
+        with self.episode_pool:
+            iterations = max_iterations
+            for it in range(1, max_iterations + 1):
+                old_values = values.copy()
+                old_policy = policy.copy()
+
+                if in_place:
+                    for s in range(self.env.n_states):
+                        episode_returns = self.rollout_cache.get(policy, states=[s])
+                        self._add_returns(s, episode_returns[s], n_episodes)
+
+                        # policy improvement
+                        best = self.qvalues.greedy_actions(s)
+                        if best != policy[s]:
+                            previous = policy.copy()
+                            policy[s] = best
+                            self.rollout_cache.invalidate(previous, policy)
+                        values[s] = self.qvalues[s, best]
+                else:
+                    episode_returns = self.rollout_cache.get(policy)
+                    self._add_returns(slice(None), episode_returns, n_episodes)
+
+                    # policy improvement
+                    policy = self.qvalues.greedy_actions()
+                    values = self.qvalues[np.arange(self.env.n_states), policy]
+                    self.rollout_cache.invalidate(old_policy, policy)
+
+                # Check for convergence
+                if np.array_equal(old_policy, policy):
+                    delta = np.abs(old_values - values).max()
+                    if delta < threshold:
+                        iterations = it
+                        break
+
+        self.values = dict(zip(self.states, values.tolist()))
+        self.policy = {state: self.actions[a] for state, a in zip(self.states, policy.tolist())}
 
         self.env.render(self.values, self.policy, folder_path=str(project_root / 'renders' / 'mc_basic'),
             title=f'iteration={iterations}, '
@@ -75,6 +109,7 @@ if __name__ == "__main__":
         "threshold": 1e-4,
         "n_episodes": 1,
         "episode_length": 20,
+        "n_workers": 0,
     }
 
     env = GridWorld(
@@ -92,6 +127,7 @@ if __name__ == "__main__":
     mc = MCBasic(
         env=env,
         gamma=config["gamma"],
+        n_workers=config["n_workers"],
     )
     mc.solve(
         max_iterations=config["max_iterations"],
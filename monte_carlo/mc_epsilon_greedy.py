@@ -1,12 +1,21 @@
 from pathlib import Path
 
+import numpy as np
+
 project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
+from src.q_table import QTable
+from src.mc_returns import aggregate_returns, discounted_returns, update_running_average, visit_mask
+from src.episode_pool import EpisodePool
+from src.sampling import EpsilonGreedySampler
 
 class MCEpsilonGreedy:
-    def __init__(self, env, gamma):
+    def __init__(self, env, gamma, seed=None, n_workers=0):
         self.env = env
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.episode_pool = EpisodePool(env, n_workers, seed)
 
         self.states = self.env.states
         self.actions = self.env.actions
@@ -14,52 +23,114 @@ class MCEpsilonGreedy:
 
         self.gamma = gamma
 
-        self.avg_return = {(state, action): 0.0 for state in self.states for action in self.actions}
-        self.return_counts = {(state, action): 0 for state in self.states for action in self.actions}
+        self.avg_return = QTable(self.env.n_states, self.n_actions)
+        self.return_counts = np.zeros((self.env.n_states, self.n_actions), dtype=np.int64)
         self.policy = {state: self.actions[0] for state in self.states}  # greedy action under epsilon-greedy policy
-        self.policy_probs = {state: {} for state in self.states}  # action probabilities per state
+        self.policy_probs = np.full((self.env.n_states, self.n_actions), 1.0 / self.n_actions)  # [S, A] action probabilities
         self.values = {state: 0.0 for state in self.states}
 
-    def solve(self, n_episodes, episode_length, epsilon):
-        self.policy_probs = {
-            state: {action: 1.0 / self.n_actions for action in self.actions}
-            for state in self.states
-        }
+    def _improve_policy(self, epsilon):
+        """Epsilon-greedy rows for every visited state at once. Returns: greedy action per state"""
+        q = self.avg_return.q
+        visited = self.return_counts > 0
+        has_visits = visited.any(axis=1)
+        greedy = np.where(visited, q, -np.inf).argmax(axis=1)
+        self.policy_probs[has_visits] = epsilon / self.n_actions
+        self.policy_probs[has_visits, greedy[has_visits]] += 1.0 - epsilon
+        return greedy
+
+    def _solve_single(self, n_episodes, episode_length, epsilon):
+        """
+        One episode per policy update. At this size NumPy's per-call overhead
+        dominates, so episodes, returns and the greedy actions of the visited
+        states are handled as Python lists and written back at the end.
+        """
+        vec_env = self.episode_pool.vec_env
+        sampler = EpsilonGreedySampler(self.n_actions, epsilon, self.seed)
+        uniforms = sampler.uniforms
+        start_indices = self.env.start_indices.tolist()
+
+        q = self.avg_return.q.tolist()
+        counts = self.return_counts.tolist()
+        greedy = [
+            max((a for a in range(self.n_actions) if row[a]), key=q[s].__getitem__) if any(row) else None
+            for s, row in enumerate(counts)
+        ]
+
+        def next_action(state):
+            # states without returns yet still follow the uniform policy
+            if greedy[state] is None:
+                return uniforms.sample_uniform(self.n_actions)
+            return sampler.sample_from_greedy(greedy[state])
 
         for _ in range(n_episodes):
             # Start each episode with a random state-action pair to ensure exploration
-            state, action = self.env.sample_state_action_pair()
-            episode = self.env.generate_stochastic_episode(state, self.policy_probs, episode_length, action=action)
+            start_state = start_indices[uniforms.sample_uniform(len(start_indices))]
+            first_action = uniforms.sample_uniform(self.n_actions)
+            states, actions, rewards = vec_env.rollout_single(start_state, first_action, next_action, episode_length)
 
-            # Calculate returns and update action-value estimates
+            # Every-visit returns, folded into running averages
             discounted_return = 0.0
-            for state_t, action_t, reward_t, _, _ in reversed(episode):
+            for state_t, action_t, reward_t in zip(reversed(states), reversed(actions), reversed(rewards)):
                 discounted_return = self.gamma * discounted_return + reward_t
-                self.return_counts[(state_t, action_t)] += 1
-                alpha = 1.0 / self.return_counts[(state_t, action_t)]
-                self.avg_return[(state_t, action_t)] += (discounted_return - self.avg_return[(state_t, action_t)]) * alpha
-
-            # Update epsilon-greedy policy
-            for state_t in self.states:
-                visited_actions = [a for a in self.actions if self.return_counts[(state_t, a)] > 0]
-                if not visited_actions:
-                    continue
-
-                qvalues = {a: self.avg_return[(state_t, a)] for a in visited_actions}
-                self.policy[state_t] = max(qvalues, key=lambda act: qvalues[act])
-
-                uniform_prob = epsilon / self.n_actions
-                self.policy_probs[state_t] = {a: uniform_prob for a in self.actions}
-                self.policy_probs[state_t][self.policy[state_t]] += (1.0 - epsilon)
+                counts[state_t][action_t] += 1
+                q[state_t][action_t] += (discounted_return - q[state_t][action_t]) / counts[state_t][action_t]
+
+            # Greedy action among the visited actions of every state in the episode
+            for state_t in set(states):
+                row, seen = q[state_t], counts[state_t]
+                greedy[state_t] = max((a for a in range(self.n_actions) if seen[a]), key=row.__getitem__)
+
+        self.avg_return.q[:] = q
+        self.return_counts[:] = counts
+
+    def solve(self, n_episodes, episode_length, epsilon, batch_size=1):
+        """
+        Every-visit MC control with exploring epsilon-greedy episodes.
+
+        `batch_size` episodes are rolled out in lockstep under the same policy;
+        their returns are aggregated at once before the policy is improved.
+        With `batch_size=1` (the default) the policy is improved after every
+        episode, which runs on plain Python lists instead.
+        """
+        self.policy_probs = np.full((self.env.n_states, self.n_actions), 1.0 / self.n_actions)
+        q = self.avg_return.q
+
+        rng = self.rng
+
+        if batch_size == 1:
+            self._solve_single(n_episodes, episode_length, epsilon)
+        else:
+            with self.episode_pool:
+                for first in range(0, n_episodes, batch_size):
+                    n = min(batch_size, n_episodes - first)
+                    # Start each episode with a random state-action pair to ensure exploration
+                    start_states = self.env.start_indices[rng.integers(0, len(self.env.start_indices), size=n)]
+                    first_actions = rng.integers(0, self.n_actions, size=n)
+                    episode_chunks = self.episode_pool.iter_rollouts(
+                        start_states, self.policy_probs, episode_length, first_actions=first_actions
+                    )
+
+                    # Calculate returns and aggregate them chunk by chunk as the workers deliver
+                    batch_sum = np.zeros_like(q)
+                    batch_count = np.zeros_like(self.return_counts)
+                    for states, actions, rewards, lengths in episode_chunks:
+                        returns = discounted_returns(rewards, lengths, self.gamma)
+                        mask = visit_mask(states, actions, lengths, self.n_actions, first_visit=False)
+                        chunk_sum, chunk_count = aggregate_returns(
+                            states, actions, returns, mask, self.env.n_states, self.n_actions
+                        )
+                        batch_sum += chunk_sum
+                        batch_count += chunk_count
+                    update_running_average(q, self.return_counts, batch_sum, batch_count)
+                    self._improve_policy(epsilon)
+
+        greedy = self._improve_policy(epsilon)
 
         # Calculate state values under the final epsilon-greedy policy
-        for state in self.states:
-            state_value = 0.0
-            for action, prob in self.policy_probs[state].items():
-                if self.return_counts[(state, action)] == 0:
-                    continue
-                state_value += self.avg_return[(state, action)] * prob
-            self.values[state] = state_value
+        state_values = (np.where(self.return_counts > 0, q, 0.0) * self.policy_probs).sum(axis=1)
+        self.values = dict(zip(self.states, state_values.tolist()))
+        self.policy = {state: self.actions[a] for state, a in zip(self.states, greedy.tolist())}
 
         self.env.render(self.values, self.policy, folder_path=str(project_root / "renders" / "mc_epsilon_greedy"),
             title=f'n_episodes={n_episodes}, '
@@ -83,6 +154,8 @@ if __name__ == "__main__":
         "n_episodes": 10000,
         "episode_length": 200,
         "epsilon": 0.1,
+        "batch_size": 1,  # > 1 rolls out that many episodes per policy update
+        "n_workers": 0,  # rollout processes, used when batch_size > 1
     }
 
     env = GridWorld(
@@ -100,9 +173,11 @@ if __name__ == "__main__":
     mc = MCEpsilonGreedy(
         env=env,
         gamma=config["gamma"],
+        n_workers=config["n_workers"],
     )
     mc.solve(
         n_episodes=config["n_episodes"],
         episode_length=config["episode_length"],
         epsilon=config["epsilon"],
+        batch_size=config["batch_size"],
     )
\ No newline at end of file
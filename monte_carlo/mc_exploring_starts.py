@@ -1,11 +1,21 @@
 from pathlib import Path
+
+import numpy as np
+
 project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
+from src.q_table import QTable
+from src.mc_returns import aggregate_returns, discounted_returns, update_running_average, visit_mask
+from src.episode_pool import EpisodePool
+from src.sampling import UniformStream
 
 class MCExploringStarts:
-    def __init__(self, env, gamma):
+    def __init__(self, env, gamma, seed=None, n_workers=0):
         self.env = env
+        self.rng = np.random.default_rng(seed)
+        self.uniforms = UniformStream(seed)
+        self.episode_pool = EpisodePool(env, n_workers, seed)
 
         self.states = self.env.states
         self.actions = self.env.actions
@@ -14,35 +24,105 @@ class MCExploringStarts:
 
         self.policy = {state: self.actions[0] for state in self.states}  # Initialize policy
         self.values = {state: 0.0 for state in self.states}  # Initialize value
-        self.avg_return = {(state, action): 0.0 for state in self.states for action in self.actions}
-        self.return_counts = {(state, action): 0 for state in self.states for action in self.actions}
+        self.avg_return = QTable(self.env.n_states, len(self.actions))
+        self.return_counts = np.zeros((self.env.n_states, len(self.actions)), dtype=np.int64)
+
+    def _solve_single(self, n_episodes, episode_length, policy, values):
+        """
+        One episode per policy update. At this size NumPy's per-call overhead
+        dominates, so episodes, returns and the improved actions are handled as
+        Python lists and written back (into `policy` and `values` too) at the end.
+        """
+        vec_env = self.episode_pool.vec_env
+        uniforms = self.uniforms
+        start_indices = self.env.start_indices.tolist()
+        n_actions = len(self.actions)
+
+        q = self.avg_return.q.tolist()
+        counts = self.return_counts.tolist()
+        greedy = policy.tolist()
+        state_values = values.tolist()
 
-    def solve(self, n_episodes, episode_length):
         for _ in range(n_episodes):
             # Start each episode with a random state-action pair
-            state, action = self.env.sample_state_action_pair()
-            episode = self.env.generate_deterministic_episode(state, self.policy, episode_length, action=action)
+            start_state = start_indices[uniforms.sample_uniform(len(start_indices))]
+            first_action = uniforms.sample_uniform(n_actions)
+            states, actions, rewards = vec_env.rollout_single(start_state, first_action, greedy.__getitem__,
+                                                              episode_length)
 
             # First-visit strategy
             first_visit_index = {}
-            for t, (state_t, action_t, _, _, _) in enumerate(episode):
-                if (state_t, action_t) not in first_visit_index:
-                    first_visit_index[(state_t, action_t)] = t
+            for t, pair in enumerate(zip(states, actions)):
+                first_visit_index.setdefault(pair, t)
 
             discounted_return = 0.0
-            for t in range(len(episode) - 1, -1, -1):
-                state_t, action_t, reward_t, _, _ = episode[t]
-                discounted_return = self.gamma * discounted_return + reward_t
+            for t in range(len(states) - 1, -1, -1):
+                state_t, action_t = states[t], actions[t]
+                discounted_return = self.gamma * discounted_return + rewards[t]
                 if first_visit_index[(state_t, action_t)] != t:
                     continue
 
-                self.return_counts[(state_t, action_t)] += 1
-                alpha = 1.0 / self.return_counts[(state_t, action_t)]
-                self.avg_return[(state_t, action_t)] += alpha * (discounted_return - self.avg_return[(state_t, action_t)])
+                counts[state_t][action_t] += 1
+                q[state_t][action_t] += (discounted_return - q[state_t][action_t]) / counts[state_t][action_t]
+
+            for state_t in set(states):
+                row = q[state_t]
+                greedy[state_t] = max(range(n_actions), key=row.__getitem__)
+                state_values[state_t] = row[greedy[state_t]]
+
+        self.avg_return.q[:] = q
+        self.return_counts[:] = counts
+        policy[:] = greedy
+        values[:] = state_values
+
+    def solve(self, n_episodes, episode_length, batch_size=1):
+        """
+        First-visit MC control with exploring starts.
+
+        `batch_size` episodes are rolled out in lockstep under the same policy;
+        their returns are aggregated at once before the policy is improved.
+        With `batch_size=1` (the default) the policy is improved after every
+        episode, which runs on plain Python lists instead.
+        """
+        policy = np.array([self.env.action_to_index[self.policy[state]] for state in self.states], dtype=np.int64)
+        values = np.array([self.values[state] for state in self.states], dtype=np.float64)
+        q = self.avg_return.q
+
+        rng = self.rng
+        n_actions = len(self.actions)
+
+        if batch_size == 1:
+            self._solve_single(n_episodes, episode_length, policy, values)
+        else:
+            with self.episode_pool:
+                for first in range(0, n_episodes, batch_size):
+                    n = min(batch_size, n_episodes - first)
+                    # Start each episode with a random state-action pair
+                    start_states = self.env.start_indices[rng.integers(0, len(self.env.start_indices), size=n)]
+                    first_actions = rng.integers(0, n_actions, size=n)
+                    episode_chunks = self.episode_pool.iter_rollouts(
+                        start_states, policy, episode_length, first_actions=first_actions
+                    )
+
+                    # First-visit strategy, aggregated chunk by chunk as the workers deliver
+                    batch_sum = np.zeros_like(q)
+                    batch_count = np.zeros_like(self.return_counts)
+                    for states, actions, rewards, lengths in episode_chunks:
+                        returns = discounted_returns(rewards, lengths, self.gamma)
+                        mask = visit_mask(states, actions, lengths, n_actions, first_visit=True)
+                        chunk_sum, chunk_count = aggregate_returns(
+                            states, actions, returns, mask, self.env.n_states, n_actions
+                        )
+                        batch_sum += chunk_sum
+                        batch_count += chunk_count
+                    update_running_average(q, self.return_counts, batch_sum, batch_count)
+
+                    visited = batch_count.any(axis=1)
+                    policy[visited] = q[visited].argmax(axis=1)
+                    values[visited] = q[visited].max(axis=1)
 
-                qvalues = {action: self.avg_return[(state_t, action)] for action in self.actions}
-                self.policy[state_t] = max(qvalues, key=lambda act: qvalues[act])
-                self.values[state_t] = qvalues[self.policy[state_t]]
+        self.values = dict(zip(self.states, values.tolist()))
+        self.policy = {state: self.actions[a] for state, a in zip(self.states, policy.tolist())}
 
         self.env.render(self.values, self.policy, folder_path=str(project_root / 'renders' / 'mc_exploring_starts'),
             title=f'n_episodes={n_episodes}, '
@@ -64,6 +144,8 @@ if __name__ == "__main__":
         "gamma": 0.9,
         "n_episodes": 10000,
         "episode_length": 200,
+        "batch_size": 1,  # > 1 rolls out that many episodes per policy update
+        "n_workers": 0,  # rollout processes, used when batch_size > 1
     }
 
     env = GridWorld(
@@ -81,8 +163,10 @@ if __name__ == "__main__":
     mc = MCExploringStarts(
         env=env,
         gamma=config["gamma"],
+        n_workers=config["n_workers"],
     )
     mc.solve(
         n_episodes=config["n_episodes"],
         episode_length=config["episode_length"],
+        batch_size=config["batch_size"],
     )
\ No newline at end of file
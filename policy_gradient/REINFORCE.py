@@ -11,14 +11,19 @@ from torch.utils.data import DataLoader, TensorDataset
 project_root = Path(__file__).resolve().parent.parent
 
 from src.grid_world import GridWorld
+from src.mc_returns import discounted_returns
 from src.plot_utils import plot_loss
+from src.policy_extraction import greedy_values_and_actions, to_state_dicts
+from src.state_encoder import StateEncoder
+from src.vector_grid_world import VectorGridWorld
 
 class REINFORCE:
-    def __init__(self, env, seed, gamma, lr, net_size) -> None:
+    def __init__(self, env, seed, gamma, lr, net_size, state_encoding="coords") -> None:
         self.set_seed(seed)
 
         self.env = env
         self.start_pos = self.env.start_state
+        self.vec_env = VectorGridWorld(self.env, seed=seed)
         
         self.states = self.env.states
         self.n_states = len(self.states)
@@ -29,14 +34,16 @@ class REINFORCE:
         self.lr = lr
 
         self.device = self.get_device()
+        self.encoder = StateEncoder(self.env, state_encoding, self.device)
         self.PI_net = nn.Sequential(
-            nn.Linear(2, net_size),
+            nn.Linear(self.encoder.dim, net_size),
             nn.ReLU(),
             nn.Dropout(0.1),
             nn.Linear(net_size, self.n_actions)
         )
         self.PI_net.to(self.device)
         self.optimizer = torch.optim.Adam(self.PI_net.parameters(), lr = self.lr)
+        self.state_features = self.encoder.features
 
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         self.folder_path = str(project_root / "renders" / "REINFORCE" / f"{self.timestamp}")
@@ -51,75 +58,87 @@ class REINFORCE:
         print(f"Using device: {device}")
         return device
 
-    def state_to_tensor(self, state):
-        x_ = self.env.width - 1
-        y_ = self.env.height - 1
-
-        x, y = state
-        states_tensor = torch.tensor((x / x_, y / y_), dtype=torch.float32, device=self.device)
-
-        return states_tensor    
-
-    def solve(self, n_episodes, episode_max_len):
+    def _collect_episodes(self, n, episode_max_len):
+        """
+        Roll out `n` episodes from the start state in lockstep. The policy is
+        fixed during a batch, so pi(.|s) is computed at most once per state.
+
+        When the batch could visit every state (n * episode_max_len >= S), one
+        forward covers all states. Otherwise only the states the episodes reach
+        are evaluated, with one forward per step over the newly reached ones, so
+        the cost follows the episode lengths rather than the grid size.
+
+        Returns: (states [n, L], actions [n, L], rewards [n, L], lengths [n])
+        """
+        start_states = np.full(n, self.vec_env.start_index)
+        if n * episode_max_len >= self.n_states:
+            with torch.no_grad():
+                action_probs = torch.softmax(self.PI_net(self.state_features), dim=-1).cpu().numpy()
+            return self.vec_env.rollout(start_states, action_probs.astype(np.float64), episode_max_len)
+
+        action_probs = np.empty((self.n_states, self.n_actions))
+        known = np.zeros(self.n_states, dtype=bool)
+
+        def policy(states):
+            new = np.unique(states[~known[states]])
+            if new.size:
+                with torch.no_grad():
+                    logits = self.PI_net(self.state_features[torch.from_numpy(new).to(self.device)])
+                action_probs[new] = torch.softmax(logits, dim=-1).cpu().numpy()
+                known[new] = True
+            return action_probs[states]
+
+        return self.vec_env.rollout(start_states, policy, episode_max_len)
+
+    def _episode_loss(self, states, actions, rewards, lengths):
+        """
+        REINFORCE loss for a batch of padded episodes with one forward pass.
+
+        Returns are normalized within each episode; each episode's loss is
+        averaged over its steps and the batch loss is the mean over episodes.
+        """
+        valid = np.arange(states.shape[1]) < lengths[:, None]
+        returns = discounted_returns(rewards, lengths, self.gamma)
+
+        n = lengths[:, None]
+        mean = returns.sum(axis=1, keepdims=True) / n
+        centered = np.where(valid, returns - mean, 0.0)
+        std = np.sqrt((centered ** 2).sum(axis=1, keepdims=True) / np.maximum(n - 1, 1))
+        normalized = centered / (std + 1e-8) / n
+
+        logits = self.PI_net(self.state_features[torch.from_numpy(states[valid]).to(self.device)])
+        log_pi = F.log_softmax(logits, dim=-1).gather(
+            1, torch.from_numpy(actions[valid]).to(self.device).unsqueeze(1)
+        ).squeeze(1)
+        weights = torch.as_tensor(normalized[valid], dtype=torch.float32, device=self.device)
+
+        # monte carlo: G --> q(s.a) | 梯度上升
+        return -(log_pi * weights).sum() / len(lengths)
+
+    def solve(self, n_episodes, episode_max_len, episodes_per_update=1):
+        """`episodes_per_update` episodes are rolled out together and averaged into one gradient step."""
         loss_record = []
-        for ep in range(1, n_episodes + 1):
-            state = self.start_pos
-            state_tensor = self.state_to_tensor(state)
-
-            episode = []
-            done = False
-            step = 0
-            while not done and step < episode_max_len:
-                step += 1
-                logits = self.PI_net(state_tensor)
-                action_probs = torch.softmax(logits, dim=-1)
-                action_dist = torch.distributions.Categorical(action_probs)
-                action_index = action_dist.sample().item()
-                action = self.actions[int(action_index)]
-
-                next_state, reward = self.env.get_next_state_and_reward(state, action)
-                episode.append((state_tensor, action_index, reward))
-                done = self.env.is_target(next_state)
-
-                state = next_state
-                state_tensor = self.state_to_tensor(state)
-
-            returns = []
-            G = 0
-            for _, _, reward in reversed(episode):
-                G = G * self.gamma + reward
-                returns.append(G)
-            returns.reverse()
-            returns = torch.tensor(returns, device=self.device)
-
-            returns = (returns - returns.mean()) / (returns.std() + 1e-8)
+        render_interval = max(1, n_episodes // 10)
+        next_render = render_interval
+        ep = 0
+        while ep < n_episodes:
+            n = min(episodes_per_update, n_episodes - ep)
+            ep += n
+            states, actions, rewards, lengths = self._collect_episodes(n, episode_max_len)
 
             self.optimizer.zero_grad()
-            loss = torch.tensor(0.0, requires_grad=True, device=self.device)
-            for (state_tensor, action_index, _), G_tensor in zip(episode, returns):
-                logits = self.PI_net(state_tensor)
-                action_probs = torch.softmax(logits, dim=0)
-                action_dist = torch.distributions.Categorical(action_probs)
-                action_tensor = torch.tensor(action_index, device=self.device)
-                log_pi = action_dist.log_prob(action_tensor)
-                loss = loss - log_pi * G_tensor  # monte carlo: G --> q(s.a) | 梯度上升
-
-            loss = loss / len(episode)
+            loss = self._episode_loss(states, actions, rewards, lengths)
             loss_record.append(loss.item())
             loss.backward()
             self.optimizer.step()
 
-            if ep % 10 == 0:
+            if len(loss_record) % 10 == 0:
                 print(f"{sum(loss_record[-10:])/10:.4f}", end=' ')
 
-            if ep % (n_episodes // 10) == 0:
-                target_policy = {}
-                for state in self.states:
-                    state_tensor = self.state_to_tensor(state)
-                    logits = self.PI_net(state_tensor)
-                    action_probs = torch.softmax(logits, dim=0)
-                    best_action_index = torch.argmax(action_probs, dim=0).item()
-                    target_policy[state] = self.actions[int(best_action_index)]
+            if ep >= next_render:
+                next_render += render_interval
+                _, best_actions = greedy_values_and_actions(self.PI_net, self.state_features)
+                _, target_policy = to_state_dicts(self.env, action_indices=best_actions)
                 self.env.render(None, target_policy, self.folder_path, 
                                 title=f"episode:{ep}/{n_episodes}")
                     
@@ -151,6 +170,8 @@ if __name__ == "__main__":
         "net_size": 128,
         "n_episodes": 50000,
         "max_episode_len": 100,
+        "episodes_per_update": 1,
+        "state_encoding": "coords",  # "coords", "one_hot", "fourier" or "tile"
     }
 
     env = GridWorld(
@@ -172,6 +193,7 @@ if __name__ == "__main__":
         gamma=config["gamma"],
         lr=config["lr"],
         net_size=config["net_size"],
+        state_encoding=config["state_encoding"],
     )
-    loss_record = reinforce.solve(config["n_episodes"], config["max_episode_len"])
+    loss_record = reinforce.solve(config["n_episodes"], config["max_episode_len"], config["episodes_per_update"])
     reinforce.plot_loss_(loss_record)
@@ -0,0 +1,55 @@
+import torch
+
+
+class TensorBatches:
+
+    """
+    Minibatches over equally long tensors, without a DataLoader.
+
+    Each epoch draws one `torch.randperm`, gathers every tensor into a
+    preallocated shuffled copy with `index_select`, and yields contiguous
+    slices of those copies. With `pin_memory` the tensors stay in pinned host
+    memory and each batch is copied to `device` asynchronously; otherwise they
+    are moved to `device` once up front.
+    """
+
+    def __init__(self, tensors, batch_size: int, shuffle: bool = True, device=None,
+                 pin_memory: bool = False, generator: torch.Generator | None = None):
+        tensors = tuple(tensors)
+        if not tensors:
+            raise ValueError("at least one tensor is required")
+        n = tensors[0].shape[0]
+        if any(t.shape[0] != n for t in tensors):
+            raise ValueError("all tensors must have the same first dimension")
+
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.generator = generator
+        self.n = n
+        self.device = torch.device(device) if device is not None else tensors[0].device
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+
+        if self.pin_memory:
+            self.tensors = tuple(t.cpu().pin_memory() for t in tensors)
+        else:
+            self.tensors = tuple(t.to(self.device) for t in tensors)
+        self._shuffled = tuple(torch.empty_like(t) for t in self.tensors)
+
+    def __len__(self) -> int:
+        return -(-self.n // self.batch_size)
+
+    def __iter__(self):
+        if self.shuffle:
+            storage = self.tensors[0].device
+            perm = torch.randperm(self.n, generator=self.generator).to(storage)
+            for t, out in zip(self.tensors, self._shuffled):
+                torch.index_select(t, 0, perm, out=out)
+            source = self._shuffled
+        else:
+            source = self.tensors
+
+        for lo in range(0, self.n, self.batch_size):
+            batch = tuple(t[lo:lo + self.batch_size] for t in source)
+            if self.pin_memory:
+                batch = tuple(t.to(self.device, non_blocking=True) for t in batch)
+            yield batch
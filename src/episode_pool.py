@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from src.grid_world import GridWorld
+from src.vector_grid_world import VectorGridWorld
+
+
+_worker_env: VectorGridWorld | None = None
+_worker_policy_memory: SharedMemory | None = None
+
+
+def _init_worker(env: GridWorld, policy_memory_name: str) -> None:
+    global _worker_env, _worker_policy_memory
+    _worker_env = VectorGridWorld(env)
+    _worker_policy_memory = SharedMemory(name=policy_memory_name)
+
+
+def _rollout_chunk(vec_env, start_states, first_actions, policy, max_length, seed):
+    """
+    Roll out one chunk with its own seed; encode compactly for transfer.
+
+    Rewards are not sent back: they are `vec_env.reward[states, actions]`.
+    """
+    vec_env.rng = np.random.default_rng(seed)
+    states, actions, _, lengths = vec_env.rollout(start_states, policy, max_length, first_actions=first_actions)
+    return states.astype(np.int32), actions.astype(np.int8), lengths.astype(np.int32)
+
+
+def _worker_rollout_chunk(start_states, first_actions, policy_shape, policy_dtype, max_length, seed):
+    policy = np.ndarray(policy_shape, dtype=policy_dtype, buffer=_worker_policy_memory.buf)
+    return _rollout_chunk(_worker_env, start_states, first_actions, policy, max_length, seed)
+
+
+class EpisodePool:
+
+    """
+    Episode generation fanned out over a process pool.
+
+    Every worker holds its own copy of the GridWorld and a view of one shared
+    policy buffer, both set up once by the pool initializer; each call writes
+    the current policy there instead of pickling it into every chunk. A batch
+    of start states is cut into fixed-size chunks and chunk i is rolled out
+    with the i-th child of one `SeedSequence`, so results depend on `seed` and
+    `chunk_size` but not on `n_workers`. `n_workers=0` runs the same chunks
+    in-process.
+
+    Use it as a context manager (or call `close`) to shut the workers down.
+    """
+
+    def __init__(self, env: GridWorld, n_workers: int = 0, seed: int | None = None, chunk_size: int = 256):
+        self.env = env
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.seed_sequence = np.random.SeedSequence(seed)
+
+        self.vec_env = VectorGridWorld(env)
+        self._executor: ProcessPoolExecutor | None = None
+        self._policy_memory: SharedMemory | None = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """Stop the workers (cancelling queued chunks) and free the shared policy buffer."""
+        try:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+        finally:
+            self._executor = None
+            if self._policy_memory is not None:
+                self._policy_memory.close()
+                self._policy_memory.unlink()
+                self._policy_memory = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # room for either policy form: [S] action indices or [S, A] probabilities
+            self._policy_memory = SharedMemory(create=True, size=self.env.n_states * self.env.n_actions * 8)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_workers, initializer=_init_worker,
+                initargs=(self.env, self._policy_memory.name),
+            )
+        return self._executor
+
+    def _share_policy(self, policy) -> np.ndarray:
+        policy = np.asarray(policy)
+        policy = policy.astype(np.float64 if policy.ndim == 2 else np.int64, copy=False)
+        shared = np.ndarray(policy.shape, dtype=policy.dtype, buffer=self._policy_memory.buf)
+        shared[...] = policy
+        return shared
+
+    def iter_rollouts(self, start_states, policy, max_length, first_actions=None):
+        """
+        Yield rolled-out chunks in submission order, as soon as each is ready.
+
+        Each item is (states [n, L] int32, actions [n, L] int8, rewards [n, L] float64,
+        lengths [n] int32) for one chunk, as in `VectorGridWorld.rollout`.
+        """
+        start_states = np.asarray(start_states, dtype=np.int64).reshape(-1)
+        if first_actions is not None:
+            first_actions = np.asarray(first_actions, dtype=np.int64).reshape(-1)
+
+        bounds = range(0, start_states.size, self.chunk_size)
+        seeds = self.seed_sequence.spawn(len(bounds))
+        chunks = [
+            (
+                start_states[lo:lo + self.chunk_size],
+                None if first_actions is None else first_actions[lo:lo + self.chunk_size],
+                seed,
+            )
+            for lo, seed in zip(bounds, seeds)
+        ]
+
+        if self.n_workers == 0:
+            for starts, firsts, seed in chunks:
+                yield self._with_rewards(*_rollout_chunk(self.vec_env, starts, firsts, policy, max_length, seed))
+            return
+
+        executor = self._get_executor()
+        shared = self._share_policy(policy)
+        futures = [
+            executor.submit(_worker_rollout_chunk, starts, firsts, shared.shape, shared.dtype.str, max_length, seed)
+            for starts, firsts, seed in chunks
+        ]
+        try:
+            for future in futures:
+                yield self._with_rewards(*future.result())
+        finally:
+            # the next call overwrites the shared policy, so no chunk of this one may still run
+            for future in futures:
+                future.cancel()
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()
+
+    def _with_rewards(self, states, actions, lengths):
+        """Rebuild a chunk's rewards from the env's reward table, zero past each length."""
+        rewards = self.vec_env.reward[states, actions]
+        rewards[np.arange(states.shape[1]) >= lengths[:, None]] = 0.0
+        return states, actions, rewards, lengths
+
+    def rollout(self, start_states, policy, max_length, first_actions=None):
+        """
+        Same contract as `VectorGridWorld.rollout`, with the work spread over the pool.
+
+        Returns: (states [N, L], actions [N, L], rewards [N, L], lengths [N]) padded with zeros
+        """
+        chunks = list(self.iter_rollouts(start_states, policy, max_length, first_actions))
+        if not chunks:
+            empty = np.zeros((0, 0), dtype=np.int64)
+            return empty, empty, np.zeros((0, 0)), np.zeros(0, dtype=np.int64)
+
+        longest = max(chunk[0].shape[1] for chunk in chunks)
+
+        def pad(arrays):
+            return np.concatenate([np.pad(a, ((0, 0), (0, longest - a.shape[1]))) for a in arrays])
+
+        states = pad([c[0] for c in chunks]).astype(np.int64)
+        actions = pad([c[1] for c in chunks]).astype(np.int64)
+        rewards = pad([c[2] for c in chunks])
+        lengths = np.concatenate([c[3] for c in chunks]).astype(np.int64)
+        return states, actions, rewards, lengths
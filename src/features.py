@@ -0,0 +1,189 @@
+from itertools import product
+
+import numpy as np
+
+
+BASES = ("polynomial", "fourier", "rbf", "tile")
+
+
+def normalized_coords(env, centered: bool = False) -> np.ndarray:
+    """
+    (x / (width - 1), y / (height - 1)) of every state, in state-index order.
+
+    Returns: [S, 2] float64 in [0, 1], or in [-1, 1] if `centered`
+    """
+    coords = np.asarray(env.states, dtype=np.float64)
+    coords = coords / np.array([max(env.width - 1, 1), max(env.height - 1, 1)], dtype=np.float64)
+    return 2.0 * coords - 1.0 if centered else coords
+
+
+def one_hot_features(n_states: int) -> np.ndarray:
+    """Returns: [S, S] identity, i.e. a tabular encoding"""
+    return np.eye(n_states, dtype=np.float64)
+
+
+def polynomial_features(coords: np.ndarray, degree: int = 4) -> np.ndarray:
+    """
+    Monomials x^i y^j of 2-D points with i + j <= degree.
+
+    Terms are grouped by total degree k as [x^k, y^k, x^(k-1) y, ..., x y^(k-1)],
+    i.e. 1, x, y, x^2, y^2, xy, x^3, y^3, x^2 y, x y^2, ...
+
+    Returns: [N, (degree + 1)(degree + 2) / 2]
+    """
+    x, y = coords[:, 0], coords[:, 1]
+    columns = [np.ones(len(coords))]
+    for k in range(1, degree + 1):
+        columns += [x ** k, y ** k]
+        columns += [x ** (k - i) * y ** i for i in range(1, k)]
+    return np.stack(columns, axis=1)
+
+
+def fourier_features(coords: np.ndarray, order: int = 3) -> np.ndarray:
+    """
+    Fourier cosine basis cos(pi * c . s) for every c in {0, ..., order}^d.
+
+    Returns: [N, (order + 1)^d]
+    """
+    coefficients = np.array(list(product(range(order + 1), repeat=coords.shape[1])), dtype=np.float64)
+    return np.cos(np.pi * coords @ coefficients.T)
+
+
+def tile_features(coords: np.ndarray, n_tilings: int = 4, tiles_per_dim: int = 4) -> np.ndarray:
+    """
+    Binary tile coding of points in [0, 1]^d with `n_tilings` evenly offset grids.
+
+    Each tiling has `tiles_per_dim + 1` tiles per dimension so the offset grids
+    still cover the unit cube; exactly one tile per tiling is active.
+
+    Returns: [N, n_tilings * (tiles_per_dim + 1)^d]
+    """
+    n, d = coords.shape
+    side = tiles_per_dim + 1
+    tiles_per_tiling = side ** d
+
+    features = np.zeros((n, n_tilings * tiles_per_tiling), dtype=np.float64)
+    strides = side ** np.arange(d)
+    for k in range(n_tilings):
+        offset = k / (n_tilings * tiles_per_dim)
+        cells = np.minimum(np.floor((coords + offset) * tiles_per_dim).astype(np.int64), side - 1)
+        features[np.arange(n), k * tiles_per_tiling + cells @ strides] = 1.0
+    return features
+
+
+def rbf_features(coords: np.ndarray, centers_per_dim: int = 5, width: float | None = None) -> np.ndarray:
+    """
+    Gaussian radial basis functions centred on a regular grid over [0, 1]^d.
+
+    `width` is the standard deviation; it defaults to the centre spacing.
+
+    Returns: [N, centers_per_dim^d]
+    """
+    d = coords.shape[1]
+    grid = np.linspace(0.0, 1.0, centers_per_dim)
+    centers = np.array(list(product(grid, repeat=d)))
+    if width is None:
+        width = 1.0 / max(centers_per_dim - 1, 1)
+
+    sq_dist = ((coords[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    return np.exp(-sq_dist / (2.0 * width ** 2))
+
+
+def state_feature_matrix(coords: np.ndarray, basis: str = "polynomial", **params) -> np.ndarray:
+    """
+    Features of every state for one of `BASES`, built once; row i belongs to state index i.
+
+    Returns: [S, d]
+    """
+    if basis == "polynomial":
+        return polynomial_features(coords, **params)
+    if basis == "fourier":
+        return fourier_features(coords, **params)
+    if basis == "rbf":
+        return rbf_features(coords, **params)
+    if basis == "tile":
+        return tile_features(coords, **params)
+    raise ValueError(f"basis must be one of {BASES}, got {basis!r}")
+
+
+# Sparse features: each state activates a fixed number k of feature ids, given as
+# (indices [N, k], values [N, k]) so a linear update costs O(k) instead of O(d).
+
+SPARSE_BASES = BASES + ("hashed_tile",)
+
+
+def hashed_tile_features(coords: np.ndarray, n_tilings: int = 8, tiles_per_dim: int = 8,
+                         memory_size: int = 4096) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Tile coding whose (tiling, tile) ids are hashed into `memory_size` slots.
+
+    Memory stays fixed however fine the tilings are, and every point activates
+    exactly `n_tilings` features (hash collisions only share weights).
+
+    Returns: (indices [N, n_tilings] int64, values [N, n_tilings] all ones)
+    """
+    n, d = coords.shape
+    primes = np.array([19349663, 83492791, 50331653, 25165843][:d], dtype=np.int64)
+    if len(primes) < d:
+        raise ValueError("hashed_tile_features supports at most 4 dimensions")
+
+    indices = np.empty((n, n_tilings), dtype=np.int64)
+    for k in range(n_tilings):
+        offset = k / (n_tilings * tiles_per_dim)
+        cells = np.floor((coords + offset) * tiles_per_dim).astype(np.int64)
+        h = np.full(n, k * 73856093, dtype=np.int64)
+        for j in range(d):
+            h ^= cells[:, j] * primes[j]
+        indices[:, k] = h % memory_size
+    return indices, np.ones((n, n_tilings), dtype=np.float64)
+
+
+def sparse_rbf_features(coords: np.ndarray, centers_per_dim: int = 10, width: float | None = None,
+                        radius: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Gaussian RBFs on a regular centre grid over [0, 1]^d, truncated to the
+    (2 * radius + 1)^d centres around each point's nearest centre.
+
+    Returns: (indices [N, (2 * radius + 1)^d] int64, values [N, (2 * radius + 1)^d])
+    """
+    n, d = coords.shape
+    window = 2 * radius + 1
+    if window > centers_per_dim:
+        raise ValueError(f"centers_per_dim must be at least {window} for radius={radius}")
+    spacing = 1.0 / max(centers_per_dim - 1, 1)
+    if width is None:
+        width = spacing
+
+    nearest = np.rint(coords / spacing).astype(np.int64)
+    lo = np.clip(nearest - radius, 0, centers_per_dim - window)
+
+    offsets = np.array(list(product(range(window), repeat=d)), dtype=np.int64)  # [k, d]
+    centers = lo[:, None, :] + offsets[None, :, :]  # [N, k, d] grid coordinates
+    strides = centers_per_dim ** np.arange(d)[::-1]
+    indices = centers @ strides
+    sq_dist = ((coords[:, None, :] - centers * spacing) ** 2).sum(axis=2)
+    return indices, np.exp(-sq_dist / (2.0 * width ** 2))
+
+
+def sparse_state_features(coords: np.ndarray, basis: str = "hashed_tile", **params):
+    """
+    Sparse features of every state for one of `SPARSE_BASES`.
+
+    "hashed_tile", and "rbf" when a `radius` is given (see `sparse_rbf_features`),
+    are sparse by construction; the other bases are dense and list all of their
+    features.
+
+    Returns: (indices [S, k] int64, values [S, k], feature dimension d)
+    """
+    if basis == "hashed_tile":
+        indices, values = hashed_tile_features(coords, **params)
+        return indices, values, params.get("memory_size", 4096)
+    if basis == "rbf" and "radius" in params:
+        indices, values = sparse_rbf_features(coords, **params)
+        return indices, values, params.get("centers_per_dim", 10) ** coords.shape[1]
+    if basis not in SPARSE_BASES:
+        raise ValueError(f"basis must be one of {SPARSE_BASES}, got {basis!r}")
+
+    dense = state_feature_matrix(coords, basis, **params)
+    n, dim = dense.shape
+    return np.broadcast_to(np.arange(dim), (n, dim)), dense, dim
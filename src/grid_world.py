@@ -4,9 +4,13 @@ from typing import Mapping, Sequence
 from pathlib import Path
 from datetime import datetime
 
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle, Circle
 
+from src.sampling import UniformStream, sample_categorical
+from src.trajectory import Trajectory
+
 
 class GridWorld:
 
@@ -27,6 +31,12 @@ class GridWorld:
         5: (0, 0),   # stay
     }
 
+    # Cell types of the occupancy grid `cell_types[x, y]`.
+    CELL_FREE = 0
+    CELL_FORBIDDEN = 1
+    CELL_TARGET = 2
+    CELL_WALL = 3  # blocked like the boundary
+
     def __init__(
         self,
         width: int,
@@ -39,16 +49,23 @@ class GridWorld:
         r_forbidden: float | None = None,
         r_step: float | None = None,
         r_stay: float | None = None,
+        seed: int | None = None,
+        walls: Sequence[Sequence[int]] | None = None,
     ):
         """
         GridWorld constructor.
 
         Reward and start parameters are expected to be passed directly.
+        `seed` seeds the uniform stream used to sample actions from policies;
+        without one, sampling follows the global `random` module.
+        `walls` are cells that cannot be entered; bumping into one costs `r_boundary`.
         """
         self.width = width
         self.height = height
         self.target = (int(target[0]), int(target[1]))
         self.forbidden = [(int(f[0]), int(f[1])) for f in (forbidden or [])]
+        self.forbidden_set = frozenset(self.forbidden)
+        self.walls = [(int(w[0]), int(w[1])) for w in (walls or [])]
 
         self.states: list[tuple[int, int]] = [(x, y) for x in range(self.width) for y in range(self.height)]
         self.actions = list(self.ACTIONS.keys())
@@ -67,12 +84,34 @@ class GridWorld:
         self.r_step = 0 if r_step is None else r_step
         self.r_stay = 0 if r_stay is None else r_stay
 
+        self.cell_types = self._build_cell_types()
+        if self.is_wall(self.start_state):
+            raise ValueError(f"Invalid start state {self.start_state}: it is a wall")
+
+        # Integer-indexed tabular model: state i is self.states[i], action j is self.actions[j].
+        self.n_states = len(self.states)
+        self.n_actions = len(self.actions)
+        self.state_to_index = {state: i for i, state in enumerate(self.states)}
+        self.action_to_index = {action: j for j, action in enumerate(self.actions)}
+        self.next_state_index, self.reward = self._build_transition_model()
+        self.target_index = self.state_to_index.get(self.target)
+        # State indices an episode may start from: every cell but the walls.
+        self.start_indices = np.flatnonzero(self.cell_types.ravel() != self.CELL_WALL)
+
+        self.uniforms = UniformStream(seed)
+
+    def seed(self, seed: int | None = None) -> None:
+        self.uniforms.seed(seed)
+
     def in_bounds(self, state: tuple[int, int]) -> bool:
         x, y = state
         return 0 <= x < self.width and 0 <= y < self.height
 
     def is_forbidden(self, state: tuple[int, int]) -> bool:
-        return state in self.forbidden
+        return state in self.forbidden_set
+
+    def is_wall(self, state: tuple[int, int]) -> bool:
+        return self.in_bounds(state) and self.cell_types[state] == self.CELL_WALL
 
     def is_target(self, state: tuple[int, int]) -> bool:
         return state == self.target
@@ -94,17 +133,32 @@ class GridWorld:
     def _sample_action_from_probs(
         self,
         state: tuple[int, int],
-        policy_probs: Mapping[tuple[int, int], Mapping[int, float]],
+        policy_probs: Mapping[tuple[int, int], Mapping[int, float]] | np.ndarray,
     ) -> int:
+        if isinstance(policy_probs, np.ndarray):
+            weights = policy_probs[self.state_to_index[state]].tolist()
+            return self.actions[sample_categorical(weights, self.uniforms.next())]
+
         probs = policy_probs[state]
         actions = list(probs.keys())
         weights = [probs[a] for a in actions]
-        return random.choices(actions, weights=weights, k=1)[0]
+        return actions[sample_categorical(weights, self.uniforms.next())]
+
+    def _deterministic_action(
+        self,
+        state: tuple[int, int],
+        deterministic_policy: Mapping[tuple[int, int], int] | np.ndarray,
+    ) -> int:
+        if isinstance(deterministic_policy, np.ndarray):
+            return self.actions[deterministic_policy[self.state_to_index[state]]]
+        return deterministic_policy[state]
 
     def reset(self, start_state: Sequence[int] | None = None) -> tuple[int, int]:
         state = self.start_state if start_state is None else (int(start_state[0]), int(start_state[1]))
         if not self.in_bounds(state):
             raise ValueError(f"Invalid reset state {state}: out of grid bounds")
+        if self.is_wall(state):
+            raise ValueError(f"Invalid reset state {state}: it is a wall")
 
         self.current_state = state
         return self.current_state
@@ -115,63 +169,106 @@ class GridWorld:
         done = self.is_target(next_state)
         return next_state, reward, done
 
+    def _build_cell_types(self) -> np.ndarray:
+        """Occupancy grid `cell_types[x, y]` (uint8); the target wins over forbidden."""
+        cell_types = np.full((self.width, self.height), self.CELL_FREE, dtype=np.uint8)
+        for cells, cell_type in ((self.forbidden, self.CELL_FORBIDDEN),
+                                 ([self.target], self.CELL_TARGET),
+                                 (self.walls, self.CELL_WALL)):
+            inside = [cell for cell in cells if self.in_bounds(cell)]
+            if inside:
+                xs, ys = zip(*inside)
+                cell_types[list(xs), list(ys)] = cell_type
+        return cell_types
+
+    def _cell_rewards(self, action: int) -> np.ndarray:
+        """Reward for entering each cell type with `action`, indexed by cell type."""
+        free_reward = self.r_stay if action == 5 else self.r_step
+        return np.array([free_reward, self.r_forbidden, self.r_target, self.r_boundary], dtype=np.float64)
+
+    def _build_transition_model(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Tabulate the deterministic dynamics once, one vectorized pass per action.
+
+        Returns: (next_state_index[S, A] int64, reward[S, A] float64)
+        """
+        index = np.arange(self.n_states)
+        xs, ys = np.divmod(index, self.height)  # states are x-major
+
+        next_state_index = np.empty((self.n_states, self.n_actions), dtype=np.int64)
+        reward = np.empty((self.n_states, self.n_actions), dtype=np.float64)
+        for j, action in enumerate(self.actions):
+            dx, dy = self.ACTIONS[action]
+            cx, cy = xs + dx, ys + dy
+            inside = (0 <= cx) & (cx < self.width) & (0 <= cy) & (cy < self.height)
+            cell = np.full(self.n_states, self.CELL_WALL, dtype=np.uint8)
+            cell[inside] = self.cell_types[cx[inside], cy[inside]]
+
+            blocked = cell == self.CELL_WALL
+            next_state_index[:, j] = np.where(blocked, index, cx * self.height + cy)
+            reward[:, j] = self._cell_rewards(action)[cell]
+        return next_state_index, reward
+
     def get_next_state_and_reward(self, state: tuple[int, int], action: int) -> tuple[tuple[int, int], float]:
         """
         Compute the next state and reward for taking `action` in `state`.
 
-        This inlines the former `apply_action` and `get_reward` logic so callers
-        get both pieces of information from one place.
+        In-grid states are answered from the precomputed `next_state_index` /
+        `reward` tables; anything else falls back to `_transition`.
 
         Returns: (next_state, reward)
         """
         if action not in self.ACTIONS:
             raise ValueError(f"Invalid action {action}. Valid actions: {list(self.ACTIONS.keys())}")
 
+        i = self.state_to_index.get(tuple(state))
+        if i is None:
+            return self._transition(state, action)
+
+        j = self.action_to_index[action]
+        return self.states[self.next_state_index[i, j]], float(self.reward[i, j])
+
+    def _transition(self, state: tuple[int, int], action: int) -> tuple[tuple[int, int], float]:
+        """
+        Evaluate the dynamics directly (bounds / wall check, reward by cell type).
+
+        Returns: (next_state, reward)
+        """
         x, y = tuple(state)
         dx, dy = self.ACTIONS[action]
         candidate = (x + dx, y + dy)
 
-        if not self.in_bounds(candidate):
+        cell = self.cell_types[candidate] if self.in_bounds(candidate) else self.CELL_WALL
+        if cell == self.CELL_WALL:
             next_state = (x, y)
             reward = self.r_boundary
             return next_state, reward
 
-        # Otherwise move into candidate
-        next_state = candidate
-
-        # Target / forbidden / step rewards
-        if self.is_target(next_state):
-            reward = self.r_target
-        elif self.is_forbidden(next_state):
-            reward = self.r_forbidden
-        else:
-            if action == 5:  # stay action
-                reward = self.r_stay
-            else:
-                reward = self.r_step
-
-        return next_state, reward
+        # Otherwise move into candidate; target / forbidden / step rewards by cell type
+        return candidate, float(self._cell_rewards(action)[cell])
     
     def generate_stochastic_episode(self, start_state=None, policy_probs=None, max_length=100, action=None):
         """
         Generate an episode by following `policy_probs` starting from `start_state`.
 
-        - `policy_probs` is a dict mapping state -> action probabilities (dict).
+        - `policy_probs` is a dict mapping state -> action probabilities (dict), or an
+          [S, A] array of probabilities indexed by state index and action index.
         - `max_length` is the maximum length of the episode (to prevent infinite loops).
 
-        Returns: list of (state, action, reward, next_state, done) tuples.
+        Returns: Trajectory of (state index, action index, reward, next state index, done).
         """
         if policy_probs is None:
             raise ValueError("policy_probs must be provided for stochastic episode generation")
 
-        episode = []
+        episode = Trajectory(max_length)
         current_state = self.reset(start_state)
         if action is None:
             action = self._sample_action_from_probs(current_state, policy_probs)
 
         for _ in range(max_length):
             next_state, reward, done = self.step(action)
-            episode.append((current_state, action, reward, next_state, done))
+            episode.append(self.state_to_index[current_state], self.action_to_index[action],
+                           reward, self.state_to_index[next_state], done)
             if done:
                 break
             current_state = next_state
@@ -183,23 +280,27 @@ class GridWorld:
         """
         Generate an episode by following a deterministic policy.
 
-        Returns: list of (state, action, reward, next_state, done) tuples.
+        `deterministic_policy` is a dict mapping state -> action, or an [S] array of
+        action indices indexed by state index.
+
+        Returns: Trajectory of (state index, action index, reward, next state index, done).
         """
         if deterministic_policy is None:
             raise ValueError("deterministic_policy must be provided for deterministic episode generation")
 
-        episode = []
+        episode = Trajectory(max_length)
         current_state = self.reset(start_state)
         if action is None:
-            action = deterministic_policy[current_state]
+            action = self._deterministic_action(current_state, deterministic_policy)
 
         for _ in range(max_length):
             next_state, reward, done = self.step(action)
-            episode.append((current_state, action, reward, next_state, done))
+            episode.append(self.state_to_index[current_state], self.action_to_index[action],
+                           reward, self.state_to_index[next_state], done)
             if done:
                 break
             current_state = next_state
-            action = deterministic_policy[current_state]
+            action = self._deterministic_action(current_state, deterministic_policy)
 
         return episode
 
@@ -225,6 +326,7 @@ class GridWorld:
 
         w, h = self.width, self.height
         fig, ax = plt.subplots(figsize=(w * 1.2, h * 1.2))
+        cell_types = self.cell_types.tolist()
 
         # Draw cells
         for x in range(w):
@@ -233,10 +335,13 @@ class GridWorld:
                 # default facecolor
                 face = 'white'
                 edge = 'black'
-                if cell in self.forbidden:
+                cell_type = cell_types[x][y]
+                if cell_type == self.CELL_FORBIDDEN:
                     face = 'orange'
-                if cell == self.target:
+                elif cell_type == self.CELL_TARGET:
                     face = '#a6cee3'  # light blue
+                elif cell_type == self.CELL_WALL:
+                    face = 'dimgray'
 
                 rect = Rectangle((x, y), 1, 1, facecolor=face, edgecolor=edge)
                 ax.add_patch(rect)
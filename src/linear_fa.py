@@ -0,0 +1,136 @@
+import numpy as np
+
+from src.features import sparse_state_features
+from src.lstd import lspi
+from src.plot_utils import plot_episode_stats
+from src.trajectory import Trajectory
+
+
+class LinearFAMixin:
+
+    """
+    Action-blocked linear Q-function shared by the linear FA agents.
+
+    Q(s, a) = W[a] . phi(s), with phi(s) stored sparsely for every state as
+    (feature ids, values) and looked up by state index. Expects `env`,
+    `states` and `actions` on the agent; `solve_lstd` also needs the agent's
+    `_choose_action` and `_target_probs` (the policy LSPI evaluates).
+    """
+
+    def _init_features(self, coords, basis, params):
+        """Build phi(s) for every state from `coords` and zero the weights W[A, d]."""
+        self.feature_indices, self.feature_values, self.feature_dim = sparse_state_features(coords, basis, **params)
+        # dense bases list every feature as active; those rows are used whole, without index arrays
+        self.dense_features = self.feature_indices.shape[1] == self.feature_dim and np.array_equal(
+            self.feature_indices, np.broadcast_to(np.arange(self.feature_dim), self.feature_indices.shape)
+        )
+        self.W = np.zeros((len(self.actions), self.feature_dim))
+
+    def _active(self, state):
+        """Returns: (active feature ids, their values) of phi(s)"""
+        i = self.env.state_to_index[state]
+        if self.dense_features:
+            return slice(None), self.feature_values[i]
+        return self.feature_indices[i], self.feature_values[i]
+
+    def _q_s(self, state):
+        """Q(s, a) for every action index, shape [n_actions]."""
+        indices, values = self._active(state)
+        return self.W[:, indices] @ values
+
+    def _q_all(self):
+        """Q(s, a) for every state index and action index, shape [S, n_actions]."""
+        return np.stack(
+            [(self.W[j][self.feature_indices] * self.feature_values).sum(axis=1) for j in range(len(self.actions))],
+            axis=1,
+        )
+
+    def _materialize_policy(self):
+        """Greedy policy table (and max-Q values) from the current weights, e.g. for rendering."""
+        q = self._q_all()
+        greedy = q.argmax(axis=1)
+        self.policy = {state: self.actions[j] for state, j in zip(self.states, greedy.tolist())}
+        return dict(zip(self.states, q.max(axis=1).tolist()))
+
+    def _q_states(self, state_indices, W):
+        """Q(s, a) under weights `W` for a batch of state indices and every action index, shape [N, n_actions]."""
+        return np.einsum("ank,nk->na", W[:, self.feature_indices[state_indices]], self.feature_values[state_indices])
+
+    def _phi_s_a(self, state_indices, action_indices):
+        """
+        Sparse phi(s, a) for a batch of pairs: the active features of s in the
+        block of weights of a.
+
+        Returns: (column ids, values), each [N, k], columns in [0, n_actions * feature_dim)
+        """
+        return (action_indices[:, None] * self.feature_dim + self.feature_indices[state_indices],
+                self.feature_values[state_indices])
+
+    def _expected_phi(self, state_indices, action_probs):
+        """
+        phi(s, a) averaged over `action_probs` ([N, n_actions]): block j of
+        row n is action_probs[n, j] * phi(s_n).
+
+        Returns: (column ids, values), each [N, n_actions * k], columns in [0, n_actions * feature_dim)
+        """
+        indices = self.feature_indices[state_indices]
+        values = self.feature_values[state_indices]
+        offsets = np.arange(len(self.actions))[None, :, None] * self.feature_dim
+        shape = (len(indices), -1)
+        return ((offsets + indices[:, None, :]).reshape(shape),
+                (action_probs[:, :, None] * values[:, None, :]).reshape(shape))
+
+    def _collect_transitions(self, n_episodes, max_steps):
+        """Episodes under the current epsilon-greedy policy. Returns: Trajectory"""
+        transitions = Trajectory(max_steps)
+        for _ in range(n_episodes):
+            step = 0
+            reward_sum = 0.0
+            state_t = self.env.reset(self.start_pos)
+            done = False
+
+            while step < max_steps and not done:
+                action_t = self._choose_action(state_t)
+                state_t1, reward, done = self.env.step(action_t)
+                reward_sum += reward
+                transitions.append(self.env.state_to_index[state_t], self.env.action_to_index[action_t],
+                                   reward, self.env.state_to_index[state_t1], done)
+                state_t = state_t1
+                step += 1
+
+            self.episode_lengths.append(step)
+            self.total_rewards.append(reward_sum)
+        return transitions
+
+    def solve_lstd(self, n_episodes, max_steps, n_iterations=20, method="batch", regularization=1e-3, tol=1e-6):
+        """
+        Least-squares alternative to `solve`: collect `n_episodes` once, then
+        fit W by LSPI (see `src.lstd.lspi`) for the agent's `_target_probs`.
+        """
+        transitions = self._collect_transitions(n_episodes, max_steps)
+        states = transitions.states.astype(np.int64)
+        actions = transitions.actions.astype(np.int64)
+        rewards = transitions.rewards.astype(np.float64)
+        next_states = transitions.next_states.astype(np.int64)
+
+        w, iterations, change = lspi(
+            self._phi_s_a(states, actions),
+            lambda action_probs: self._expected_phi(next_states, action_probs),
+            lambda w: self._q_states(next_states, w.reshape(self.W.shape)),
+            self._target_probs,
+            rewards, transitions.dones, self.gamma, self.W.ravel(),
+            n_iterations=n_iterations, method=method, regularization=regularization, tol=tol,
+        )
+        self.W = w.reshape(self.W.shape)
+        print(f"LSTD-Q: {len(transitions)} transitions, {iterations} iterations, last weight change {change:.2e}")
+
+        self.values = self._materialize_policy()
+        self.env.render(None, self.policy, folder_path=self.folder_path,
+                        title=f'LSTD-Q ({method}), n_episodes={n_episodes}, epsilon={self.epsilon}',
+                        file_name='lstd')
+        plot_episode_stats(
+            self.episode_lengths,
+            self.total_rewards,
+            out_dir=self.folder_path,
+            x_label="Episode",
+        )
@@ -0,0 +1,163 @@
+import warnings
+
+import numpy as np
+
+
+LSTD_METHODS = ("batch", "sherman_morrison")
+
+# Largest number of distinct weights one fit may touch; the system is built
+# dense over them (8 * n^2 bytes, 512 MB at the limit).
+MAX_LSTD_FEATURES = 8192
+
+# Temporary entries per chunk when accumulating A, to bound memory.
+_SCATTER_CHUNK = 1 << 22
+
+
+def _restrict_to_support(phi_indices, next_indices, next_values, max_features):
+    """
+    Renumber feature columns onto the support of phi, the only weights LSTD-Q can fit.
+
+    A row of A outside that support is just `regularization * I` with a zero
+    right-hand side, so those weights solve to 0 and are dropped together with
+    the next-state entries that would multiply them.
+
+    Returns: (support [n], phi columns [N, k], next columns [N, m], next values [N, m])
+    """
+    if phi_indices.size == 0:
+        raise ValueError("LSTD-Q needs at least one transition")
+    support, phi_cols = np.unique(phi_indices, return_inverse=True)
+    if support.size > max_features:
+        raise ValueError(
+            f"LSTD-Q would fit {support.size} weights (limit {max_features}); "
+            "use a smaller basis, fewer actions or fewer transitions"
+        )
+    pos = np.minimum(np.searchsorted(support, next_indices), support.size - 1)
+    inside = support[pos] == next_indices
+    return support, phi_cols.reshape(phi_indices.shape), np.where(inside, pos, 0), np.where(inside, next_values, 0.0)
+
+
+def _dense_rows(cols, values, n):
+    """Scatter sparse rows (cols [c, k], values [c, k]) into a dense [c, n] block."""
+    rows = np.zeros((len(cols), n))
+    np.add.at(rows, (np.arange(len(cols))[:, None], cols), values)
+    return rows
+
+
+def lstdq_batch(phi_indices, phi_values, next_indices, next_values, rewards, gamma: float, dim: int,
+                regularization: float = 1e-3, max_features: int = MAX_LSTD_FEATURES) -> np.ndarray:
+    """
+    LSTD-Q weights from a batch of transitions with one linear solve.
+
+    Features are sparse rows of column ids in [0, dim) and their values:
+    - `phi_indices` / `phi_values` [N, k]: phi(s, a).
+    - `next_indices` / `next_values` [N, m]: the expected features of (s', a')
+      under the evaluated policy (zero values for terminal transitions).
+
+    Solves (reg * I + sum phi (phi - gamma phi')^T) w = sum phi r over the
+    weights phi touches. A is accumulated chunk by chunk, by scatter-adding the
+    products of active entries for sparse rows and by a matrix product of
+    densified rows when phi is dense.
+
+    Returns: w, shape [dim]
+    """
+    support, phi_cols, next_cols, next_vals = _restrict_to_support(phi_indices, next_indices, next_values,
+                                                                   max_features)
+    n = support.size
+
+    if 20 * phi_cols.shape[1] >= n:
+        # dense-ish rows (e.g. a dense basis): one matrix product per chunk beats scattering
+        A = np.zeros((n, n))
+        chunk = max(1, _SCATTER_CHUNK // n)
+        for lo in range(0, len(phi_cols), chunk):
+            U = _dense_rows(phi_cols[lo:lo + chunk], phi_values[lo:lo + chunk], n)
+            A += U.T @ (U - gamma * _dense_rows(next_cols[lo:lo + chunk], next_vals[lo:lo + chunk], n))
+    else:
+        cols = np.concatenate([phi_cols, next_cols], axis=1)
+        vals = np.concatenate([phi_values, -gamma * next_vals], axis=1)
+        A = np.zeros(n * n)
+        chunk = max(1, _SCATTER_CHUNK // (phi_cols.shape[1] * cols.shape[1]))
+        for lo in range(0, len(phi_cols), chunk):
+            flat = phi_cols[lo:lo + chunk, :, None] * n + cols[lo:lo + chunk, None, :]
+            weights = phi_values[lo:lo + chunk, :, None] * vals[lo:lo + chunk, None, :]
+            A += np.bincount(flat.ravel(), weights=weights.ravel(), minlength=n * n)
+        A = A.reshape(n, n)
+    A[np.diag_indices(n)] += regularization
+    b = np.bincount(phi_cols.ravel(), weights=(phi_values * rewards[:, None]).ravel(), minlength=n)
+
+    w = np.zeros(dim)
+    w[support] = np.linalg.solve(A, b)
+    return w
+
+
+def lstdq_sherman_morrison(phi_indices, phi_values, next_indices, next_values, rewards, gamma: float, dim: int,
+                           regularization: float = 1e-3, max_features: int = MAX_LSTD_FEATURES,
+                           chunk_size: int = 64) -> np.ndarray:
+    """
+    Same estimate as `lstdq_batch`, keeping A^-1 up to date as transitions
+    arrive instead of solving once.
+
+    Each chunk of `chunk_size` transitions is folded in with the Woodbury
+    identity A^-1 -= A^-1 U (I + V A^-1 U)^-1 V A^-1, the rank-`chunk_size`
+    form of the Sherman-Morrison update (`chunk_size=1` is plain
+    Sherman-Morrison). Cost is O(N n^2) over the n weights phi touches.
+
+    Returns: w, shape [dim]
+    """
+    support, phi_cols, next_cols, next_vals = _restrict_to_support(phi_indices, next_indices, next_values,
+                                                                   max_features)
+    n = support.size
+
+    A_inv = np.eye(n) / regularization
+    b = np.zeros(n)
+    for lo in range(0, len(phi_cols), chunk_size):
+        U = _dense_rows(phi_cols[lo:lo + chunk_size], phi_values[lo:lo + chunk_size], n)  # [c, n]
+        V = U - gamma * _dense_rows(next_cols[lo:lo + chunk_size], next_vals[lo:lo + chunk_size], n)
+        A_inv_U = A_inv @ U.T
+        V_A_inv = V @ A_inv
+        A_inv -= A_inv_U @ np.linalg.solve(np.eye(len(U)) + V @ A_inv_U, V_A_inv)
+        b += rewards[lo:lo + chunk_size] @ U
+
+    w = np.zeros(dim)
+    w[support] = A_inv @ b
+    return w
+
+
+def lspi(phi, expected_next_phi, next_q, target_probs, rewards, dones, gamma: float, w,
+         n_iterations: int = 20, method: str = "batch", regularization: float = 1e-3, tol: float = 1e-6):
+    """
+    Least-squares policy iteration on a fixed batch of N transitions.
+
+    - `phi`: (column ids, values) [N, k] of phi(s, a) for every transition.
+    - `expected_next_phi(action_probs)`: features of s' averaged over
+      `action_probs` [N, n_actions], as (column ids, values).
+    - `next_q(w)`: Q(s', .) under weights `w`, shape [N, n_actions].
+    - `target_probs(q)`: the evaluated policy's action probabilities for Q rows `q`.
+
+    Each iteration fits `w` by LSTD-Q (`method` "batch" or "sherman_morrison")
+    for the policy `target_probs` derives from the previous `w`, until `w`
+    moves less than `tol`. Warns if `n_iterations` pass without that, e.g.
+    when LSPI oscillates between policies.
+
+    Returns: (w, iterations run, last max weight change)
+    """
+    if method not in LSTD_METHODS:
+        raise ValueError(f"method must be one of {LSTD_METHODS}, got {method!r}")
+    if n_iterations < 1:
+        raise ValueError(f"n_iterations must be at least 1, got {n_iterations}")
+    solver = lstdq_batch if method == "batch" else lstdq_sherman_morrison
+
+    phi_indices, phi_values = phi
+    # terminal transitions bootstrap from nothing
+    not_done = ~np.asarray(dones, dtype=bool)[:, None]
+
+    for iteration in range(1, n_iterations + 1):
+        next_indices, next_values = expected_next_phi(target_probs(next_q(w)) * not_done)
+        w_new = solver(phi_indices, phi_values, next_indices, next_values, rewards, gamma, w.size, regularization)
+        change = float(np.abs(w_new - w).max())
+        w = w_new
+        if change < tol:
+            return w, iteration, change
+
+    warnings.warn(f"LSTD-Q did not converge: weight change {change:.2e} is still above tol={tol:g} "
+                  f"after {n_iterations} iterations (LSPI may be oscillating between policies)", stacklevel=2)
+    return w, n_iterations, change
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def discounted_returns(rewards: np.ndarray, lengths: np.ndarray, gamma: float) -> np.ndarray:
+    """
+    Discounted returns G_t for a batch of padded episodes.
+
+    - `rewards` is [N, L] with zeros past each episode's length.
+    - `lengths` is [N], the number of transitions in each episode.
+
+    The reverse recursion G_t = r_t + gamma * G_{t+1} runs over time only and
+    is vectorized across episodes. Returns: [N, L], zero past each length.
+    """
+    n_episodes, max_length = rewards.shape
+    returns = np.zeros((n_episodes, max_length), dtype=np.float64)
+    valid = np.arange(max_length) < np.asarray(lengths)[:, None]
+
+    g = np.zeros(n_episodes, dtype=np.float64)
+    for t in range(max_length - 1, -1, -1):
+        g = np.where(valid[:, t], rewards[:, t] + gamma * g, 0.0)
+        returns[:, t] = g
+    return returns
+
+
+def visit_mask(states: np.ndarray, actions: np.ndarray, lengths: np.ndarray, n_actions: int,
+               first_visit: bool = False) -> np.ndarray:
+    """
+    Which (episode, t) entries contribute a return.
+
+    Every-visit keeps all steps inside each episode; first-visit keeps only the
+    first occurrence of each (state, action) pair per episode.
+    """
+    n_episodes, max_length = states.shape
+    valid = np.arange(max_length) < np.asarray(lengths)[:, None]
+    if not first_visit:
+        return valid
+
+    keys = states * n_actions + actions
+    n_pairs = int(keys.max()) + 1 if keys.size else 1
+    episode_keys = (np.arange(n_episodes)[:, None] * n_pairs + keys).ravel()
+
+    valid_positions = np.flatnonzero(valid.ravel())
+    _, first = np.unique(episode_keys[valid_positions], return_index=True)
+
+    mask = np.zeros(n_episodes * max_length, dtype=bool)
+    mask[valid_positions[first]] = True
+    return mask.reshape(n_episodes, max_length)
+
+
+def aggregate_returns(states: np.ndarray, actions: np.ndarray, returns: np.ndarray, mask: np.ndarray,
+                      n_states: int, n_actions: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scatter masked returns into per-(state, action) sums and counts.
+
+    Returns: (return_sum [S, A] float64, return_count [S, A] int64)
+    """
+    flat = states[mask] * n_actions + actions[mask]
+    size = n_states * n_actions
+    return_sum = np.bincount(flat, weights=returns[mask], minlength=size).reshape(n_states, n_actions)
+    return_count = np.bincount(flat, minlength=size).astype(np.int64).reshape(n_states, n_actions)
+    return return_sum, return_count
+
+
+def update_running_average(average: np.ndarray, counts: np.ndarray,
+                           batch_sum: np.ndarray, batch_count: np.ndarray) -> None:
+    """Fold a batch of (sum, count) into running averages and counts, in place."""
+    seen = batch_count > 0
+    counts[seen] += batch_count[seen]
+    average[seen] += (batch_sum[seen] - batch_count[seen] * average[seen]) / counts[seen]
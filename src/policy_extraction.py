@@ -0,0 +1,46 @@
+import numpy as np
+import torch
+
+from src.features import normalized_coords
+
+
+def normalized_state_features(env, device=None) -> torch.Tensor:
+    """
+    (x / (width - 1), y / (height - 1)) of every state, in state-index order.
+
+    Returns: [S, 2] float32 tensor on `device`
+    """
+    return torch.from_numpy(normalized_coords(env).astype(np.float32)).to(device)
+
+
+def evaluate_states(net, features: torch.Tensor) -> torch.Tensor:
+    """One batched forward pass over all state features, in eval mode and without grad."""
+    was_training = net.training
+    net.eval()
+    with torch.no_grad():
+        outputs = net(features)
+    net.train(was_training)
+    return outputs
+
+
+def greedy_values_and_actions(net, features: torch.Tensor) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Max output and argmax action index per state for a network with one output per action.
+
+    Returns: (values [S], action indices [S])
+    """
+    values, actions = evaluate_states(net, features).max(dim=1)
+    return values.cpu().numpy(), actions.cpu().numpy()
+
+
+def to_state_dicts(env, values=None, action_indices=None):
+    """
+    Per-state arrays as the dicts `env.render` expects; either argument may be None.
+
+    Returns: (state -> value, state -> action)
+    """
+    value_dict = None if values is None else dict(zip(env.states, np.asarray(values).reshape(-1).tolist()))
+    policy = None
+    if action_indices is not None:
+        policy = {state: env.actions[j] for state, j in zip(env.states, np.asarray(action_indices).tolist())}
+    return value_dict, policy
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class QTable:
+
+    """
+    Tabular action values backed by one contiguous float64 [S, A] array.
+
+    Rows are state indices (`env.state_to_index`) and columns are action
+    indices (`env.action_to_index`), so a Q(s, a) read or write is plain array
+    indexing and whole-table queries are single vectorized ops.
+    """
+
+    def __init__(self, n_states: int, n_actions: int, initial_value: float = 0.0):
+        self.n_states = n_states
+        self.n_actions = n_actions
+        self.q = np.full((n_states, n_actions), initial_value, dtype=np.float64)
+
+    def __getitem__(self, key):
+        return self.q[key]
+
+    def __setitem__(self, key, value):
+        self.q[key] = value
+
+    def greedy_actions(self, states=slice(None)) -> np.ndarray:
+        """Greedy action index per state; ties go to the first action."""
+        return self.q[states].argmax(axis=-1)
+
+    def state_values(self, states=slice(None)) -> np.ndarray:
+        return self.q[states].max(axis=-1)
+
+    def epsilon_greedy_probs(self, epsilon: float, states=slice(None)) -> np.ndarray:
+        """
+        Epsilon-greedy action probabilities for one state index or a batch.
+
+        The greedy mass (1 - epsilon) is split evenly between tied best actions.
+        """
+        q = self.q[states]
+        best = q == q.max(axis=-1, keepdims=True)
+        greedy_mass = (1.0 - epsilon) / best.sum(axis=-1, keepdims=True)
+        return best * greedy_mass + epsilon / self.n_actions
+
+    def sample_epsilon_greedy(self, states, epsilon: float, rng: np.random.Generator) -> np.ndarray:
+        """Draw one epsilon-greedy action index for each state index in `states`."""
+        cdf = np.cumsum(self.epsilon_greedy_probs(epsilon, states), axis=-1)
+        u = rng.random(cdf.shape[:-1] + (1,))
+        return np.minimum((u >= cdf).sum(axis=-1), self.n_actions - 1)
+
+    def to_value_and_policy(self, states, actions) -> tuple[dict, dict]:
+        """
+        Greedy state values and policy as dicts keyed by state, for `GridWorld.render`.
+
+        Returns: ({state: value}, {state: action})
+        """
+        greedy = self.greedy_actions()
+        values = dict(zip(states, self.q[np.arange(self.n_states), greedy].tolist()))
+        policy = {state: actions[j] for state, j in zip(states, greedy.tolist())}
+        return values, policy
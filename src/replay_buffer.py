@@ -0,0 +1,136 @@
+import numpy as np
+import torch
+
+from src.sum_tree import SumTree
+
+
+class ReplayBuffer:
+
+    """
+    Fixed-capacity circular replay memory of (state, action, reward, next_state, done).
+
+    States are stored as state indices; all fields live in preallocated tensors
+    on `device`. Inserting overwrites the oldest transitions once the buffer is
+    full, and a batch is sampled with one `torch.randint` over the filled part.
+    """
+
+    def __init__(self, capacity: int, device: torch.device | str = "cpu", generator: torch.Generator | None = None):
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+
+        self.capacity = capacity
+        self.device = torch.device(device)
+        self.generator = generator
+
+        self.states = torch.zeros(capacity, dtype=torch.long, device=self.device)
+        self.actions = torch.zeros(capacity, dtype=torch.long, device=self.device)
+        self.rewards = torch.zeros(capacity, dtype=torch.float32, device=self.device)
+        self.next_states = torch.zeros(capacity, dtype=torch.long, device=self.device)
+        self.dones = torch.zeros(capacity, dtype=torch.float32, device=self.device)
+
+        self.pos = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, states, actions, rewards, next_states, dones) -> torch.Tensor:
+        """
+        Insert a batch of transitions (array-likes of equal length), wrapping around.
+
+        Returns: buffer slots written, shape [n]
+        """
+        fields = [
+            torch.as_tensor(np.asarray(x), device=self.device).reshape(-1)
+            for x in (states, actions, rewards, next_states, dones)
+        ]
+        n = fields[0].numel()
+        # Only the newest `capacity` transitions of an oversized batch survive.
+        kept = min(n, self.capacity)
+        slots = (self.pos + (n - kept) + torch.arange(kept, device=self.device)) % self.capacity
+
+        for storage, values in zip((self.states, self.actions, self.rewards, self.next_states, self.dones), fields):
+            storage[slots] = values[n - kept:].to(storage.dtype)
+
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return slots
+
+    def add_trajectory(self, trajectory) -> torch.Tensor:
+        """Insert every transition of a `Trajectory`."""
+        return self.add(trajectory.states, trajectory.actions, trajectory.rewards,
+                        trajectory.next_states, trajectory.dones)
+
+    def sample(self, batch_size: int) -> tuple[torch.Tensor, ...]:
+        """
+        Uniformly sample `batch_size` transitions with replacement.
+
+        Returns: (states, actions, rewards, next_states, dones), each of shape [batch_size]
+        """
+        if self.size == 0:
+            raise ValueError("cannot sample from an empty replay buffer")
+
+        idx = torch.randint(0, self.size, (batch_size,), device=self.device, generator=self.generator)
+        return self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx]
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+
+    """
+    Proportional prioritized replay: slot i is drawn with probability p_i^alpha / sum_j p_j^alpha.
+
+    Priorities live in a `SumTree`. New transitions get the largest priority
+    seen so far, so each is replayed at least once soon after insertion; after a
+    gradient step `update_priorities` sets them to |TD error| + `eps`. Sampling
+    is stratified over `batch_size` equal slices of the total priority.
+    """
+
+    def __init__(self, capacity: int, device: torch.device | str = "cpu", alpha: float = 0.6,
+                 eps: float = 1e-6, seed: int | None = None):
+        super().__init__(capacity, device)
+        self.alpha = alpha
+        self.eps = eps
+        self.rng = np.random.default_rng(seed)
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0
+
+    def add(self, states, actions, rewards, next_states, dones) -> torch.Tensor:
+        slots = super().add(states, actions, rewards, next_states, dones)
+        self.tree.update(slots.cpu().numpy(), self.max_priority ** self.alpha)
+        return slots
+
+    def sample(self, batch_size: int, beta: float = 0.4) -> tuple[torch.Tensor, ...]:
+        """
+        Draw `batch_size` transitions by priority.
+
+        The importance-sampling weights (N * P(i))^-beta are divided by their
+        batch maximum so they only ever scale updates down.
+
+        Returns: (states, actions, rewards, next_states, dones, slots, weights)
+        """
+        if self.size == 0:
+            raise ValueError("cannot sample from an empty replay buffer")
+
+        total = self.tree.total
+        bounds = np.arange(batch_size) * (total / batch_size)
+        u = bounds + self.rng.random(batch_size) * (total / batch_size)
+        # Rounding can land a draw on an empty leaf past the filled slots; such a
+        # draw falls back to the last filled slot, so the weight must use the
+        # priority of the slot actually returned, not of the leaf first found.
+        slots = np.minimum(self.tree.find(u), self.size - 1)
+        priorities = self.tree[slots]
+
+        probs = priorities / total
+        weights = (self.size * probs) ** -beta
+        weights /= weights.max()
+
+        idx = torch.from_numpy(slots).to(self.device)
+        return (
+            self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx],
+            idx, torch.as_tensor(weights, dtype=torch.float32, device=self.device),
+        )
+
+    def update_priorities(self, slots: torch.Tensor, td_errors: torch.Tensor) -> None:
+        priorities = td_errors.detach().abs().cpu().numpy().astype(np.float64) + self.eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(slots.cpu().numpy(), priorities ** self.alpha)
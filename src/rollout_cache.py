@@ -0,0 +1,74 @@
+import numpy as np
+
+from src.mc_returns import discounted_returns
+from src.vector_grid_world import VectorGridWorld
+
+
+class RolloutCache:
+
+    """
+    Discounted returns of deterministic rollouts, one per (start state, first action).
+
+    With deterministic dynamics and a deterministic policy, the rollout that
+    starts with (s, a) depends only on the policy at the states it visits after
+    its first step. An entry therefore stays valid until one of those states
+    changes action; `invalidate` finds them by propagating "a changed state lies
+    ahead" backwards along the old policy's successor graph.
+    """
+
+    def __init__(self, vec_env: VectorGridWorld, gamma: float, max_length: int, episodes=None):
+        """`episodes` (e.g. an `EpisodePool`) performs the rollouts; defaults to `vec_env`."""
+        self.vec_env = vec_env
+        self.episodes = vec_env if episodes is None else episodes
+        self.gamma = gamma
+        self.max_length = max_length
+
+        self.n_states = vec_env.n_states
+        self.n_actions = vec_env.n_actions
+        self.returns = np.zeros((self.n_states, self.n_actions), dtype=np.float64)
+        self.valid = np.zeros((self.n_states, self.n_actions), dtype=bool)
+        self.n_rollouts = 0
+
+    def get(self, policy: np.ndarray, states=None) -> np.ndarray:
+        """
+        Returns of every (state, action) rollout under `policy` (an [S] array of
+        action indices); only invalid entries are rolled out again. `states`
+        restricts the refresh to those start states; other rows may be stale.
+
+        Returns: [S, A] discounted returns
+        """
+        if states is None:
+            stale = np.flatnonzero(~self.valid.ravel())
+        else:
+            states = np.asarray(states, dtype=np.int64).reshape(-1)
+            rows, cols = np.nonzero(~self.valid[states])
+            stale = states[rows] * self.n_actions + cols
+        if stale.size:
+            start_states, first_actions = np.divmod(stale, self.n_actions)
+            _, _, rewards, lengths = self.episodes.rollout(
+                start_states, policy, self.max_length, first_actions=first_actions
+            )
+            self.returns[start_states, first_actions] = discounted_returns(rewards, lengths, self.gamma)[:, 0]
+            self.valid[start_states, first_actions] = True
+            self.n_rollouts += stale.size
+        return self.returns
+
+    def invalidate(self, old_policy: np.ndarray, new_policy: np.ndarray) -> None:
+        """Drop entries whose cached trajectory (under `old_policy`) meets a changed state."""
+        changed = old_policy != new_policy
+        if not changed.any():
+            return
+
+        terminal = self.vec_env.terminal
+        next_old = self.vec_env.next_state_index[np.arange(self.n_states), old_policy]
+
+        # tainted[x]: following old_policy from x (before termination) meets a changed state.
+        origin = changed & ~terminal
+        tainted = origin
+        for _ in range(self.max_length):
+            grown = origin | (tainted[next_old] & ~terminal)
+            if np.array_equal(grown, tainted):
+                break
+            tainted = grown
+
+        self.valid &= ~tainted[self.vec_env.next_state_index]
@@ -0,0 +1,95 @@
+import random
+from bisect import bisect_right
+from itertools import accumulate
+
+import numpy as np
+
+
+class UniformStream:
+
+    """
+    Uniform [0, 1) floats handed out one at a time from pre-drawn blocks.
+
+    Drawing `block_size` numbers at once from a seeded NumPy Generator and
+    converting them to a Python list makes each scalar draw a list index.
+    Without a seed the stream defers to the global `random` module, so scripts
+    that call `random.seed` stay reproducible.
+    """
+
+    def __init__(self, seed: int | None = None, block_size: int = 4096):
+        self.block_size = block_size
+        self.seed(seed)
+
+    def seed(self, seed: int | None = None) -> None:
+        self.rng = None if seed is None else np.random.default_rng(seed)
+        self._block: list[float] = []
+        self._pos = 0
+
+    def next(self) -> float:
+        if self.rng is None:
+            return random.random()
+        if self._pos == len(self._block):
+            self._block = self.rng.random(self.block_size).tolist()
+            self._pos = 0
+        u = self._block[self._pos]
+        self._pos += 1
+        return u
+
+    def sample_uniform(self, n: int) -> int:
+        """Uniform integer in [0, n) from one draw."""
+        return min(int(self.next() * n), n - 1)
+
+
+def sample_categorical(weights, u: float) -> int:
+    """
+    Inverse-CDF draw of an index from unnormalized `weights` given a uniform `u`.
+    """
+    cum_weights = list(accumulate(weights))
+    return min(bisect_right(cum_weights, u * cum_weights[-1]), len(cum_weights) - 1)
+
+
+class EpsilonGreedySampler:
+
+    """
+    Epsilon-greedy action indices from one uniform draw per step.
+
+    With u ~ U[0, 1): if u < epsilon the action is uniform (u / epsilon rescaled
+    over all actions), otherwise it is greedy, with (u - epsilon) / (1 - epsilon)
+    choosing among tied best actions. This matches the probabilities of
+    `QTable.epsilon_greedy_probs` without building a probability row.
+    """
+
+    def __init__(self, n_actions: int, epsilon: float, seed: int | None = None, block_size: int = 4096):
+        if not 0.0 <= epsilon <= 1.0:
+            raise ValueError(f"epsilon must be in [0, 1], got {epsilon}")
+
+        self.n_actions = n_actions
+        self.epsilon = epsilon
+        self.uniforms = UniformStream(seed, block_size)
+
+    def seed(self, seed: int | None = None) -> None:
+        self.uniforms.seed(seed)
+
+    def _explore(self, u: float) -> int:
+        return min(int(u / self.epsilon * self.n_actions), self.n_actions - 1)
+
+    def sample_from_greedy(self, greedy_action: int) -> int:
+        """Epsilon-greedy around a known greedy action index."""
+        u = self.uniforms.next()
+        if u < self.epsilon:
+            return self._explore(u)
+        return greedy_action
+
+    def sample(self, q_row) -> int:
+        """Epsilon-greedy over one row of action values, splitting ties evenly."""
+        u = self.uniforms.next()
+        if u < self.epsilon:
+            return self._explore(u)
+
+        values = q_row.tolist() if isinstance(q_row, np.ndarray) else list(q_row)
+        best = max(values)
+        ties = [j for j, v in enumerate(values) if v == best]
+        if len(ties) == 1:
+            return ties[0]
+        k = int((u - self.epsilon) / (1.0 - self.epsilon) * len(ties))
+        return ties[min(k, len(ties) - 1)]
@@ -0,0 +1,52 @@
+import numpy as np
+import torch
+
+from src.features import fourier_features, normalized_coords, one_hot_features, tile_features
+
+
+ENCODINGS = ("coords", "one_hot", "fourier", "tile")
+
+
+class StateEncoder:
+
+    """
+    Network inputs for every state of a GridWorld, built once on `device`.
+
+    `features` is an [S, dim] float32 tensor; `encode` looks rows up by state
+    index or (x, y) state, so an environment step needs no tensor allocation.
+
+    Encodings:
+    - "coords": normalized (x, y)
+    - "one_hot": one unit per state
+    - "fourier": Fourier cosine basis of the normalized coordinates (`order`)
+    - "tile": binary tile coding of the normalized coordinates (`n_tilings`, `tiles_per_dim`)
+    """
+
+    def __init__(self, env, encoding: str = "coords", device=None, **params):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {ENCODINGS}, got {encoding!r}")
+
+        self.env = env
+        self.encoding = encoding
+        self.device = device
+
+        coords = normalized_coords(env)
+        if encoding == "coords":
+            features = coords
+        elif encoding == "one_hot":
+            features = one_hot_features(env.n_states)
+        elif encoding == "fourier":
+            features = fourier_features(coords, **params)
+        else:
+            features = tile_features(coords, **params)
+
+        self.features = torch.from_numpy(features.astype(np.float32)).to(device)
+        self.dim = self.features.shape[1]
+
+    def __call__(self, state_indices) -> torch.Tensor:
+        """Rows for a state index (a view) or a batch of indices."""
+        return self.features[state_indices]
+
+    def encode(self, state) -> torch.Tensor:
+        """Row for an (x, y) state, a view into `features`."""
+        return self.features[self.env.state_to_index[state]]
@@ -0,0 +1,53 @@
+import numpy as np
+
+
+class SumTree:
+
+    """
+    Binary sum tree over `capacity` non-negative priorities, stored in one array.
+
+    Node 1 is the root, node k has children 2k and 2k + 1, and the leaves sit at
+    [size, 2 * size) with `size` the next power of two >= capacity. Updating a
+    batch of leaves and finding the leaves for a batch of prefix sums both walk
+    one level at a time, vectorized over the batch: O(batch * log N).
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+
+        self.capacity = capacity
+        self.size = 1 << max(0, (capacity - 1).bit_length())
+        self.depth = self.size.bit_length() - 1
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        return float(self.tree[1])
+
+    def __getitem__(self, indices):
+        return self.tree[self.size + np.asarray(indices)]
+
+    def update(self, indices, priorities) -> None:
+        """Set the priorities of leaves `indices` and refresh their ancestors."""
+        nodes = self.size + np.asarray(indices, dtype=np.int64).reshape(-1)
+        self.tree[nodes] = np.asarray(priorities, dtype=np.float64).reshape(-1)
+        for _ in range(self.depth):
+            nodes >>= 1  # repeated parents just write the same sum twice
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, prefix_sums) -> np.ndarray:
+        """
+        Leaf index i for each value u, such that sum(p[:i]) <= u < sum(p[:i + 1]).
+
+        Returns: leaf indices, shape of `prefix_sums`
+        """
+        values = np.array(prefix_sums, dtype=np.float64)
+        nodes = np.ones(values.shape, dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values = np.where(go_right, values - self.tree[left], values)
+            nodes = left + go_right
+        # Rounding can push a draw onto an empty leaf past the filled ones.
+        return np.minimum(nodes - self.size, self.capacity - 1)
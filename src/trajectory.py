@@ -0,0 +1,93 @@
+import numpy as np
+
+
+TRANSITION_DTYPE = np.dtype(
+    [
+        ("state", np.int32),
+        ("next_state", np.int32),
+        ("reward", np.float32),
+        ("action", np.int8),
+        ("done", np.bool_),
+    ],
+    align=True,
+)
+
+
+class Trajectory:
+
+    """
+    Transitions stored in one preallocated structured NumPy array.
+
+    A record is (state index, action index, reward, next state index, done) in
+    16 bytes. The array grows by doubling when full. Slicing returns a
+    Trajectory that shares memory with this one, and the field properties
+    (`states`, `actions`, ...) are zero-copy strided views, so they can be
+    handed to `torch.from_numpy` directly.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._data = np.zeros(max(1, capacity), dtype=TRANSITION_DTYPE)
+        self._size = 0
+
+    @classmethod
+    def _view(cls, data: np.ndarray) -> "Trajectory":
+        trajectory = cls.__new__(cls)
+        trajectory._data = data
+        trajectory._size = len(data)
+        return trajectory
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, key):
+        """An int gives one (state, action, reward, next_state, done) tuple; a slice gives a view."""
+        if isinstance(key, slice):
+            return Trajectory._view(self.data[key])
+        record = self.data[key]
+        return (int(record["state"]), int(record["action"]), float(record["reward"]),
+                int(record["next_state"]), bool(record["done"]))
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def _reserve(self, size: int) -> None:
+        if size > len(self._data):
+            grown = np.zeros(max(size, 2 * len(self._data)), dtype=TRANSITION_DTYPE)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+    def append(self, state: int, action: int, reward: float, next_state: int, done: bool) -> None:
+        self._reserve(self._size + 1)
+        self._data[self._size] = (state, next_state, reward, action, done)
+        self._size += 1
+
+    def extend(self, other: "Trajectory") -> None:
+        self._reserve(self._size + len(other))
+        self._data[self._size:self._size + len(other)] = other.data
+        self._size += len(other)
+
+    @property
+    def data(self) -> np.ndarray:
+        """The filled part of the structured array (a view)."""
+        return self._data[:self._size]
+
+    @property
+    def states(self) -> np.ndarray:
+        return self.data["state"]
+
+    @property
+    def actions(self) -> np.ndarray:
+        return self.data["action"]
+
+    @property
+    def rewards(self) -> np.ndarray:
+        return self.data["reward"]
+
+    @property
+    def next_states(self) -> np.ndarray:
+        return self.data["next_state"]
+
+    @property
+    def dones(self) -> np.ndarray:
+        return self.data["done"]
@@ -0,0 +1,222 @@
+from typing import Callable
+
+import numpy as np
+
+from src.grid_world import GridWorld
+
+
+class VectorGridWorld:
+
+    """
+    N copies of one GridWorld stepped in lockstep.
+
+    States are integer indices into `env.states` and actions are indices into
+    `env.actions`, so a step is a gather on the env's `next_state_index` /
+    `reward` tables. Copies that reach the target (or hit
+    `max_episode_length`) are reset to a start state automatically.
+    """
+
+    def __init__(
+        self,
+        env: GridWorld,
+        n_envs: int = 1,
+        seed: int | None = None,
+        random_start: bool = False,
+        max_episode_length: int | None = None,
+    ):
+        self.env = env
+        self.n_envs = n_envs
+        self.random_start = random_start
+        self.max_episode_length = max_episode_length
+        self.rng = np.random.default_rng(seed)
+
+        self.n_states = env.n_states
+        self.n_actions = env.n_actions
+        self.next_state_index = env.next_state_index
+        self.reward = env.reward
+        self.terminal = np.zeros(self.n_states, dtype=bool)
+        if env.target_index is not None:
+            self.terminal[env.target_index] = True
+        self.start_index = env.state_to_index[env.start_state]
+        self.start_indices = env.start_indices
+        self.startable = np.zeros(self.n_states, dtype=bool)
+        self.startable[self.start_indices] = True
+        self.state_coords = np.array(env.states, dtype=np.int64)  # [S, 2] (x, y)
+        self._list_tables = None  # Python-list copies of the tables for `rollout_single`
+
+        self.current_states = self._sample_start_states(self.n_envs)
+        self.episode_steps = np.zeros(self.n_envs, dtype=np.int64)
+        self.truncated = np.zeros(self.n_envs, dtype=bool)
+
+    def _sample_start_states(self, n: int) -> np.ndarray:
+        if self.random_start:
+            return self.start_indices[self.rng.integers(0, len(self.start_indices), size=n, dtype=np.int64)]
+        return np.full(n, self.start_index, dtype=np.int64)
+
+    def _check_actions(self, actions: np.ndarray) -> None:
+        if actions.size and (actions.min() < 0 or actions.max() >= self.n_actions):
+            raise ValueError(f"action indices must be in [0, {self.n_actions}), got {actions.min()}..{actions.max()}")
+
+    def reset(self, n: int | None = None, start_states: np.ndarray | None = None) -> np.ndarray:
+        """
+        Reset all copies; `n` changes the number of copies.
+
+        Returns: current state indices, shape [n_envs]
+        """
+        if n is not None:
+            self.n_envs = n
+
+        if start_states is None:
+            states = self._sample_start_states(self.n_envs)
+        else:
+            states = np.array(start_states, dtype=np.int64).reshape(-1)
+            if states.shape != (self.n_envs,):
+                raise ValueError(f"start_states must have shape ({self.n_envs},), got {states.shape}")
+            if states.min() < 0 or states.max() >= self.n_states:
+                raise ValueError("start_states contains out-of-range state indices")
+            if not self.startable[states].all():
+                raise ValueError(f"start_states contains wall cells: {np.unique(states[~self.startable[states]]).tolist()}")
+
+        self.current_states = states
+        self.episode_steps = np.zeros(self.n_envs, dtype=np.int64)
+        self.truncated = np.zeros(self.n_envs, dtype=bool)
+        return self.current_states.copy()
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Advance every copy by one action index.
+
+        The returned next states are the true successors; copies that finished
+        are already reset in `current_states`. `truncated` marks copies reset
+        because they ran out of `max_episode_length` without reaching the target.
+
+        Returns: (next_states, rewards, dones), each of shape [n_envs]
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        if actions.shape != (self.n_envs,):
+            raise ValueError(f"actions must have shape ({self.n_envs},), got {actions.shape}")
+        self._check_actions(actions)
+
+        states = self.current_states
+        next_states = self.next_state_index[states, actions]
+        rewards = self.reward[states, actions]
+        dones = self.terminal[next_states]
+
+        self.episode_steps += 1
+        if self.max_episode_length is None:
+            self.truncated = np.zeros(self.n_envs, dtype=bool)
+        else:
+            self.truncated = ~dones & (self.episode_steps >= self.max_episode_length)
+
+        finished = dones | self.truncated
+        self.current_states = next_states.copy()
+        if finished.any():
+            self.current_states[finished] = self._sample_start_states(int(finished.sum()))
+            self.episode_steps[finished] = 0
+
+        return next_states, rewards, dones
+
+    def coords(self, states: np.ndarray) -> np.ndarray:
+        """Map state indices to (x, y) coordinates, shape [..., 2]."""
+        return self.state_coords[states]
+
+    def policy_actions(self, policy: np.ndarray, states: np.ndarray) -> np.ndarray:
+        """
+        Action indices for `states` under `policy`: an [S] array of action indices
+        (deterministic), an [S, A] array of probabilities, or a callable mapping
+        state indices [n] to probability rows [n, A] (both sampled with `rng`).
+        """
+        if callable(policy):
+            probs = policy(states)
+        elif policy.ndim == 1:
+            return policy[states]
+        else:
+            probs = policy[states]
+
+        cdf = np.cumsum(probs, axis=1)
+        u = self.rng.random((len(states), 1)) * cdf[:, -1:]
+        return np.minimum((u >= cdf).sum(axis=1), self.n_actions - 1)
+
+    def rollout(
+        self,
+        start_states: np.ndarray,
+        policy: np.ndarray,
+        max_length: int,
+        first_actions: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Roll out one episode per start state in lockstep, without auto-reset.
+
+        Episodes stop after the transition into the target or after `max_length`
+        steps. Independent of `current_states`.
+
+        Returns: (states [N, L], actions [N, L], rewards [N, L], lengths [N]),
+        padded with zeros past each length; L is the longest episode.
+        """
+        current = np.array(start_states, dtype=np.int64).reshape(-1)
+        n = current.size
+        states = np.zeros((n, max_length), dtype=np.int64)
+        actions = np.zeros((n, max_length), dtype=np.int64)
+        rewards = np.zeros((n, max_length), dtype=np.float64)
+        lengths = np.full(n, max_length, dtype=np.int64)
+
+        if first_actions is None:
+            act = self.policy_actions(policy, current)
+        else:
+            act = np.array(first_actions, dtype=np.int64).reshape(-1)
+            self._check_actions(act)
+
+        alive = np.arange(n)
+        for t in range(max_length):
+            s = current[alive]
+            a = act[alive]
+            next_s = self.next_state_index[s, a]
+            states[alive, t] = s
+            actions[alive, t] = a
+            rewards[alive, t] = self.reward[s, a]
+
+            done = self.terminal[next_s]
+            lengths[alive[done]] = t + 1
+            alive = alive[~done]
+            if alive.size == 0:
+                break
+            current[alive] = next_s[~done]
+            act[alive] = self.policy_actions(policy, current[alive])
+
+        longest = int(lengths.max()) if n else 0
+        return states[:, :longest], actions[:, :longest], rewards[:, :longest], lengths
+
+    def rollout_single(
+        self,
+        start_state: int,
+        first_action: int,
+        next_action: Callable[[int], int],
+        max_length: int,
+    ) -> tuple[list[int], list[int], list[float]]:
+        """
+        Roll out one episode with plain Python list lookups.
+
+        Same stopping rule as `rollout`, but for a single episode NumPy's
+        per-call overhead costs more than the step itself, so the tables are
+        read as nested lists. `next_action(state)` picks every action after
+        `first_action`.
+
+        Returns: (states, actions, rewards), each a list of the episode's length
+        """
+        if not 0 <= first_action < self.n_actions:
+            raise ValueError(f"action indices must be in [0, {self.n_actions}), got {first_action}")
+        if self._list_tables is None:
+            self._list_tables = (self.next_state_index.tolist(), self.reward.tolist(), self.terminal.tolist())
+        next_state_index, reward, terminal = self._list_tables
+
+        states, actions, rewards = [], [], []
+        state, action = start_state, first_action
+        for _ in range(max_length):
+            states.append(state)
+            actions.append(action)
+            rewards.append(reward[state][action])
+            state = next_state_index[state][action]
+            if terminal[state]:
+                break
+            action = next_action(state)
+        return states, actions, rewards
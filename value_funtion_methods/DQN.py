@@ -6,12 +6,19 @@ import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import DataLoader, TensorDataset
 
 project_root = Path(__file__).resolve().parent.parent
 
+from src.batching import TensorBatches
 from src.grid_world import GridWorld
 from src.plot_utils import plot_loss
+from src.policy_extraction import greedy_values_and_actions, normalized_state_features, to_state_dicts
+from src.replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
+from src.trajectory import Trajectory
+from src.vector_grid_world import VectorGridWorld
+
+TRAINING_MODES = ("offline", "online")
+
 
 class DQN:
     def __init__(
@@ -27,10 +34,33 @@ class DQN:
         discount_factor,
         target_update_freq,
         bootstrap_terminal,
+        training_mode="offline",
+        replay_capacity=100_000,
+        n_env_steps=0,
+        learning_starts=1_000,
+        train_freq=1,
+        epsilon=1.0,
+        prioritized=False,
+        priority_alpha=0.6,
+        priority_beta=0.4,
     ):
+        """
+        `training_mode` is "offline" (fixed dataset of `n_replay_episodes`, `n_epochs`
+        passes over it) or "online" (`n_env_steps` epsilon-greedy steps into a ring
+        buffer of `replay_capacity`, one update every `train_freq` steps after
+        `learning_starts` transitions).
+
+        `prioritized` samples replay by |TD error|^`priority_alpha`; the importance
+        weights' exponent is annealed from `priority_beta` to 1 over training.
+        """
+        if training_mode not in TRAINING_MODES:
+            raise ValueError(f"training_mode must be one of {TRAINING_MODES}, got {training_mode!r}")
+
         self.set_seed(seed)
+        self.seed = seed
 
         self.env = env
+        self.env.seed(seed)
         self.start_pos = self.env.start_state
         self.grid_size = self.env.width
         self.n_replay_episodes = n_replay_episodes
@@ -40,6 +70,15 @@ class DQN:
         self.discount_factor = discount_factor
         self.target_update_freq = target_update_freq
         self.bootstrap_terminal = bootstrap_terminal
+        self.training_mode = training_mode
+        self.replay_capacity = replay_capacity
+        self.n_env_steps = n_env_steps
+        self.learning_starts = learning_starts
+        self.train_freq = train_freq
+        self.epsilon = epsilon
+        self.prioritized = prioritized
+        self.priority_alpha = priority_alpha
+        self.priority_beta = priority_beta
 
         self.device = self.get_device()
         self.in_dim = 2
@@ -47,6 +86,9 @@ class DQN:
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         self.folder_path = str(project_root / "renders" / "DQN" / f"{self.timestamp}")
 
+        # normalized (x, y) of every state, gathered by state index
+        self.state_features = normalized_state_features(self.env, self.device)
+
         self.main_net = nn.Sequential(
             nn.Linear(self.in_dim, hidden_size),
             nn.ReLU(),
@@ -76,53 +118,30 @@ class DQN:
         print(f"Using device: {device}")
         return device
 
-    def episodes_to_dataloader(self, episodes):
-        states = []
-        actions = []
-        rewards = []
-        next_states = []
-        dones = []
-
-        action_to_index = {a: i for i, a in enumerate(self.env.actions)}
-
-        for s, a, r, s_next, done in episodes:
-            states.append((s[0] / (self.grid_size - 1), s[1] / (self.grid_size - 1)))
-            actions.append(action_to_index[a])
-            rewards.append(r)
-            next_states.append((s_next[0] / (self.grid_size - 1), s_next[1] / (self.grid_size - 1)))
-            dones.append(float(done))
+    def episodes_to_tensors(self, trajectory):
+        """
+        Returns: (states, actions, rewards, next_states, dones) tensors on the training
+        device, with states as normalized (x, y) features
+        """
+        def field(values):
+            return torch.from_numpy(values).to(self.device)
 
-        states = torch.tensor(states, dtype=torch.float32)
-        actions = torch.tensor(actions, dtype=torch.long)
-        rewards = torch.tensor(rewards, dtype=torch.float32)
-        next_states = torch.tensor(next_states, dtype=torch.float32)
-        dones = torch.tensor(dones, dtype=torch.float32)
+        states = self.state_features[field(trajectory.states).long()]
+        actions = field(trajectory.actions).long()
+        rewards = field(trajectory.rewards).float()
+        next_states = self.state_features[field(trajectory.next_states).long()]
+        dones = field(trajectory.dones).float()
 
         terminal_count = int((dones == 1.0).sum().item())
         print(f"{terminal_count}/{len(dones)} terminal transitions in the dataset.")
-
-        dataset = TensorDataset(states, actions, rewards, next_states, dones)
-        return DataLoader(dataset, batch_size=self.batch_size, shuffle=True)
+        return states, actions, rewards, next_states, dones
 
     def get_state_value_and_policy(self, net):
-        state_value = {}
-        policy = {}
-
-        for state in self.env.states:
-            state_tensor = torch.tensor(
-                (state[0] / (self.grid_size - 1), state[1] / (self.grid_size - 1)),
-                dtype=torch.float32,
-            )
-            q_s = net(state_tensor).squeeze(0)
-            best_idx = int(q_s.argmax().item())
-            q_max_val = float(q_s[best_idx].item())
-            policy[state] = self.env.actions[best_idx]
-            state_value[state] = q_max_val
+        values, actions = greedy_values_and_actions(net, self.state_features)
+        return to_state_dicts(self.env, values, actions)
 
-        return state_value, policy
-
-    def _build_replay_buffer(self):
-        episodes = []
+    def _collect_dataset(self):
+        episodes = Trajectory(self.n_replay_episodes * self.replay_episode_max_length)
         for _ in range(self.n_replay_episodes):
             episode = self.env.generate_stochastic_episode(
                 self.start_pos,
@@ -130,12 +149,90 @@ class DQN:
                 max_length=self.replay_episode_max_length,
             )
             episodes.extend(episode)
+        return episodes
 
-        replay_buffer = self.episodes_to_dataloader(episodes)
+    def _build_replay_buffer(self):
+        tensors = self.episodes_to_tensors(self._collect_dataset())
+        replay_buffer = TensorBatches(tensors, self.batch_size, device=self.device)
         print(f"length of replay_buffer: {len(replay_buffer)}")
         return replay_buffer
 
+    def _update(self, s, a_index, r, ns, done, weights=None):
+        """
+        One gradient step on a batch, importance-weighted if `weights` is given.
+
+        Returns: (loss, per-sample TD errors)
+        """
+        with torch.no_grad():
+            q_t_s = self.target_net(ns)
+            q_max = q_t_s.max(dim=1).values
+            terminal_multiplier = 1.0 if self.bootstrap_terminal else (1.0 - done)
+            y_t = r + self.discount_factor * q_max * terminal_multiplier
+
+        q_s = self.main_net(s)
+        q_s_a = q_s.gather(1, a_index.unsqueeze(1)).squeeze(1)
+
+        td_error = y_t - q_s_a
+        if weights is None:
+            loss = F.mse_loss(y_t, q_s_a)
+        else:
+            loss = (weights * td_error.pow(2)).mean()
+        self.optimizer.zero_grad()
+        loss.backward()
+        self.optimizer.step()
+        return loss.item(), td_error.detach()
+
+    def _make_replay_buffer(self, capacity):
+        if self.prioritized:
+            return PrioritizedReplayBuffer(capacity, self.device, alpha=self.priority_alpha, seed=self.seed)
+        return ReplayBuffer(capacity, self.device)
+
+    def _replay_update(self, replay_buffer, progress):
+        """Sample a batch from `replay_buffer` and train on it; `progress` in [0, 1] anneals beta."""
+        if not self.prioritized:
+            s, a_index, r, ns, done = replay_buffer.sample(self.batch_size)
+            loss, _ = self._update(self.state_features[s], a_index, r, self.state_features[ns], done)
+            return loss
+
+        beta = self.priority_beta + (1.0 - self.priority_beta) * progress
+        s, a_index, r, ns, done, slots, weights = replay_buffer.sample(self.batch_size, beta)
+        loss, td_error = self._update(self.state_features[s], a_index, r, self.state_features[ns], done, weights)
+        replay_buffer.update_priorities(slots, td_error)
+        return loss
+
+    def _behavior_actions(self, states):
+        """Epsilon-greedy action indices w.r.t. the main network for a batch of state indices."""
+        explore = np.random.random(len(states)) < self.epsilon
+        actions = np.random.randint(self.n_actions, size=len(states))
+        if not explore.all():
+            with torch.no_grad():
+                q_s = self.main_net(self.state_features[torch.from_numpy(states).to(self.device)])
+            greedy = q_s.argmax(dim=1).cpu().numpy()
+            actions = np.where(explore, actions, greedy)
+        return actions
+
+    def _render(self, title):
+        state_value, policy = self.get_state_value_and_policy(self.target_net)
+        self.env.render(state_value, policy, self.folder_path, title=title)
+
     def solve(self):
+        if self.training_mode == "online":
+            loss_record = self._solve_online()
+        else:
+            loss_record = self._solve_offline()
+
+        plot_loss(
+            loss_record,
+            out_dir=self.folder_path,
+            title="DQN Loss Curve",
+            file_name="loss_curve",
+            x_label="Update Step",
+        )
+
+    def _solve_offline(self):
+        if self.prioritized:
+            return self._solve_offline_prioritized()
+
         replay_buffer = self._build_replay_buffer()
 
         loss_record = []
@@ -145,41 +242,69 @@ class DQN:
             step = 0
             for s, a_index, r, ns, done in replay_buffer:
                 step += 1
+                loss_record.append(self._update(s, a_index, r, ns, done)[0])
 
-                with torch.no_grad():
-                    q_t_s = self.target_net(ns)
-                    q_max = q_t_s.max(dim=1).values
-                    terminal_multiplier = 1.0 if self.bootstrap_terminal else (1.0 - done)
-                    y_t = r + self.discount_factor * q_max * terminal_multiplier
+                if step % self.target_update_freq == 0:
+                    self.target_net.load_state_dict(self.main_net.state_dict())
+
+            if ep % render_freq == 0:
+                self._render(f"epoch:{ep}/{self.n_epochs}")
 
-                q_s = self.main_net(s)
-                q_s_a = q_s.gather(1, a_index.unsqueeze(1)).squeeze(1)
+        return loss_record
+
+    def _solve_offline_prioritized(self):
+        """Offline dataset replayed by priority; an epoch is len(dataset) / batch_size draws."""
+        dataset = self._collect_dataset()
+        replay_buffer = self._make_replay_buffer(len(dataset))
+        replay_buffer.add_trajectory(dataset)
+
+        loss_record = []
+        render_freq = max(1, self.n_epochs // 10)
+        updates_per_epoch = -(-len(dataset) // self.batch_size)
+        n_updates = self.n_epochs * updates_per_epoch
 
-                loss = F.mse_loss(y_t, q_s_a)
-                loss_record.append(loss.item())
-                self.optimizer.zero_grad()
-                loss.backward()
-                self.optimizer.step()
+        for ep in range(1, self.n_epochs + 1):
+            for step in range(1, updates_per_epoch + 1):
+                progress = len(loss_record) / n_updates
+                loss_record.append(self._replay_update(replay_buffer, progress))
 
                 if step % self.target_update_freq == 0:
                     self.target_net.load_state_dict(self.main_net.state_dict())
 
             if ep % render_freq == 0:
-                state_value, policy = self.get_state_value_and_policy(self.target_net)
-                self.env.render(
-                    state_value,
-                    policy,
-                    self.folder_path,
-                    title=f"epoch:{ep}/{self.n_epochs}",
-                )
+                self._render(f"epoch:{ep}/{self.n_epochs}")
 
-        plot_loss(
-            loss_record,
-            out_dir=self.folder_path,
-            title="DQN Loss Curve",
-            file_name="loss_curve",
-            x_label="Update Step",
+        return loss_record
+
+    def _solve_online(self):
+        replay_buffer = self._make_replay_buffer(self.replay_capacity)
+        vec_env = VectorGridWorld(
+            self.env, n_envs=1, seed=self.seed, max_episode_length=self.replay_episode_max_length
         )
+        states = vec_env.reset()
+
+        loss_record = []
+        render_freq = max(1, self.n_env_steps // 10)
+        n_updates = 0
+
+        for step in range(1, self.n_env_steps + 1):
+            actions = self._behavior_actions(states)
+            next_states, rewards, dones = vec_env.step(actions)
+            replay_buffer.add(states, actions, rewards, next_states, dones)
+            states = vec_env.current_states.copy()
+
+            if len(replay_buffer) >= self.learning_starts and step % self.train_freq == 0:
+                loss_record.append(self._replay_update(replay_buffer, step / self.n_env_steps))
+                n_updates += 1
+
+                if n_updates % self.target_update_freq == 0:
+                    self.target_net.load_state_dict(self.main_net.state_dict())
+
+            if step % render_freq == 0:
+                self._render(f"step:{step}/{self.n_env_steps}")
+
+        print(f"{n_updates} updates from {self.n_env_steps} environment steps.")
+        return loss_record
 
 
 if __name__ == "__main__":
@@ -203,6 +328,15 @@ if __name__ == "__main__":
         "discount_factor": 0.9,
         "target_update_freq": 20,
         "bootstrap_terminal": True,
+        "training_mode": "offline",  # or "online"
+        "replay_capacity": 50_000,
+        "n_env_steps": 100_000,
+        "learning_starts": 1_000,
+        "train_freq": 1,
+        "epsilon": 1.0,
+        "prioritized": False,
+        "priority_alpha": 0.6,
+        "priority_beta": 0.4,
     }
 
     env = GridWorld(
@@ -230,5 +364,14 @@ if __name__ == "__main__":
         discount_factor=config["discount_factor"],
         target_update_freq=config["target_update_freq"],
         bootstrap_terminal=config["bootstrap_terminal"],
+        training_mode=config["training_mode"],
+        replay_capacity=config["replay_capacity"],
+        n_env_steps=config["n_env_steps"],
+        learning_starts=config["learning_starts"],
+        train_freq=config["train_freq"],
+        epsilon=config["epsilon"],
+        prioritized=config["prioritized"],
+        priority_alpha=config["priority_alpha"],
+        priority_beta=config["priority_beta"],
     )
     dqn.solve()
\ No newline at end of file
@@ -1,14 +1,18 @@
 from pathlib import Path
-import random
 from datetime import datetime
 
+import numpy as np
+
 project_root = Path(__file__).resolve().parent.parent
 
+from src.features import normalized_coords
 from src.grid_world import GridWorld
+from src.linear_fa import LinearFAMixin
 from src.plot_utils import plot_episode_stats
+from src.sampling import EpsilonGreedySampler
 
-class QLearningWithFA:
-    def __init__(self, env, gamma, alpha, epsilon):
+class QLearningWithFA(LinearFAMixin):
+    def __init__(self, env, gamma, alpha, epsilon, basis="polynomial", basis_params=None, seed=None):
         self.env = env
 
         self.states = self.env.states
@@ -21,14 +25,14 @@ class QLearningWithFA:
         self.start_pos = self.env.start_state
         self.target_pos = self.env.target
 
-        self.feature_dim = 15
-        self.w = [0.0] * (self.feature_dim * len(self.actions))
-        self.policy_probs = {
-            state: {a: 1.0 / len(self.actions) for a in self.actions}
-            for state in self.states
-        }
-        self.policy_probs[self.target_pos] = {a: 0.0 for a in self.actions}
-        self.policy_probs[self.target_pos][5] = 1.0
+        # polynomials use coordinates centred in [-1, 1]; the other bases expect [0, 1]
+        coords = normalized_coords(self.env, centered=(basis == "polynomial"))
+        params = {"degree": 4} if basis == "polynomial" else {}
+        params.update(basis_params or {})
+        # sparse phi(s) for every state and action-blocked weights: Q(s, a) = W[a] . phi(s)
+        self._init_features(coords, basis, params)
+        # epsilon-greedy w.r.t. the current weights, drawn at action-selection time
+        self.sampler = EpsilonGreedySampler(len(self.actions), self.epsilon, seed)
 
         self.policy = {state: self.actions[0] for state in self.states}
         self.values = {state: 0.0 for state in self.states}
@@ -38,77 +42,30 @@ class QLearningWithFA:
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         self.folder_path = str(project_root / "renders" / "q_learning_with_FA" / f"{self.timestamp}")
 
-    def _phi_s_a(self, state, action):
-        features = []
-
-        x, y = state
-        x = x - (self.grid_size - 1) / 2
-        y = y - (self.grid_size - 1) / 2
-        x = x / ((self.grid_size - 1) / 2)
-        y = y / ((self.grid_size - 1) / 2)
-
-        f_state = [
-            1.0,
-            x,
-            y,
-            x**2,
-            y**2,
-            x * y,
-            x**3,
-            y**3,
-            x**2 * y,
-            x * y**2,
-            x**4,
-            y**4,
-            x**3 * y,
-            x**2 * y**2,
-            x * y**3,
-        ]
-        f_zero = [0.0] * len(f_state)
-
-        index = self.actions.index(action)
-        for i, _ in enumerate(self.actions):
-            if i == index:
-                features.extend(f_state)
-            else:
-                features.extend(f_zero)
-
-        return features
-
-    def _q_s_a(self, state, action):
-        features = self._phi_s_a(state, action)
-        return sum(self.w[i] * features[i] for i in range(len(self.w)))
-
     def _choose_action(self, state):
-        probs = self.policy_probs[state]
-        actions = list(probs.keys())
-        weights = [probs[a] for a in actions]
-        return random.choices(actions, weights=weights, k=1)[0]
+        if state == self.target_pos:
+            return 5
+        return self.actions[self.sampler.sample(self._q_s(state))]
 
     def _update_w(self, state, action, reward, next_state):
-        phi_t = self._phi_s_a(state, action)
-        q_t = self._q_s_a(state, action)
+        row = self.env.action_to_index[action]
+        indices, values = self._active(state)
+        q_t = self.W[row, indices] @ values
         if next_state == self.target_pos:
             q_t1 = 0.0
         else:
-            q_t1 = max(self._q_s_a(next_state, next_action) for next_action in self.actions)
+            q_t1 = self._q_s(next_state).max()
         td_error = reward + self.gamma * q_t1 - q_t
 
-        for i in range(len(self.w)):
-            self.w[i] += self.alpha * td_error * phi_t[i]
-
-    def _update_policy_probs(self, state):
-        q_values = {a: self._q_s_a(state, a) for a in self.actions}
-        max_q = max(q_values.values())
-        best_actions = [a for a, q in q_values.items() if q == max_q]
-        n_best = len(best_actions)
-        n_actions = len(self.actions)
-        add = (1.0 - self.epsilon) / n_best
+        # only the taken action's active features are non-zero
+        if self.dense_features:
+            self.W[row] += self.alpha * td_error * values
+        else:
+            np.add.at(self.W[row], indices, self.alpha * td_error * values)
 
-        for a in self.actions:
-            self.policy_probs[state][a] = self.epsilon / n_actions
-            if a in best_actions:
-                self.policy_probs[state][a] += add
+    def _target_probs(self, q):
+        """LSPI target policy: greedy w.r.t. `q` ([N, n_actions]), as one-hot rows."""
+        return np.eye(len(self.actions))[q.argmax(axis=1)]
 
     def solve(self, n_episodes, max_steps, log_interval=100):
         for episode in range(1, n_episodes + 1):
@@ -123,7 +80,6 @@ class QLearningWithFA:
                 reward_sum += reward
 
                 self._update_w(state_t, action_t, reward, state_t1)
-                self._update_policy_probs(state_t)
 
                 state_t = state_t1
                 step += 1
@@ -132,9 +88,7 @@ class QLearningWithFA:
             self.total_rewards.append(reward_sum)
 
             if episode % log_interval == 0:
-                for state in self.states:
-                    q_values = {a: self._q_s_a(state, a) for a in self.actions}
-                    self.policy[state] = max(q_values, key=lambda action: q_values[action])
+                self._materialize_policy()
 
                 self.env.render(
                     None,
@@ -145,10 +99,7 @@ class QLearningWithFA:
                     file_name=f'episode_{episode}'
                 )
 
-        for state in self.states:
-            q_values = {a: self._q_s_a(state, a) for a in self.actions}
-            self.policy[state] = max(q_values, key=lambda action: q_values[action])
-            self.values[state] = q_values[self.policy[state]]
+        self.values = self._materialize_policy()
 
         plot_episode_stats(
             self.episode_lengths,
@@ -175,6 +126,12 @@ if __name__ == "__main__":
         "n_episodes": 1000,
         "max_steps": 200,
         "log_interval": 100,
+        "basis": "polynomial",  # "polynomial", "fourier", "rbf", "tile" or "hashed_tile"
+        "basis_params": None,  # None: the basis' defaults
+        "solver": "td",  # or "lstd": least-squares fit on a fixed batch of episodes
+        "lstd_episodes": 50,
+        "lstd_iterations": 20,
+        "lstd_method": "batch",  # or "sherman_morrison"
     }
 
     env = GridWorld(
@@ -195,9 +152,19 @@ if __name__ == "__main__":
         gamma=config["gamma"],
         alpha=config["alpha"],
         epsilon=config["epsilon"],
+        basis=config["basis"],
+        basis_params=config["basis_params"],
     )
-    ql_fa.solve(
-        n_episodes=config["n_episodes"],
-        max_steps=config["max_steps"],
-        log_interval=config["log_interval"],
-    )
\ No newline at end of file
+    if config["solver"] == "lstd":
+        ql_fa.solve_lstd(
+            n_episodes=config["lstd_episodes"],
+            max_steps=config["max_steps"],
+            n_iterations=config["lstd_iterations"],
+            method=config["lstd_method"],
+        )
+    else:
+        ql_fa.solve(
+            n_episodes=config["n_episodes"],
+            max_steps=config["max_steps"],
+            log_interval=config["log_interval"],
+        )
\ No newline at end of file
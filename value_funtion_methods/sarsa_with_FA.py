@@ -1,14 +1,18 @@
 from pathlib import Path
-import random
 from datetime import datetime
 
+import numpy as np
+
 project_root = Path(__file__).resolve().parent.parent
 
+from src.features import normalized_coords
 from src.grid_world import GridWorld
+from src.linear_fa import LinearFAMixin
 from src.plot_utils import plot_episode_stats
+from src.sampling import EpsilonGreedySampler
 
-class SarsaWithFA:
-    def __init__(self, env, gamma, alpha, epsilon):
+class SarsaWithFA(LinearFAMixin):
+    def __init__(self, env, gamma, alpha, epsilon, basis="polynomial", basis_params=None, seed=None):
         self.env = env
 
         self.states = self.env.states
@@ -21,14 +25,13 @@ class SarsaWithFA:
         self.start_pos = self.env.start_state
         self.target_pos = self.env.target
 
-        self.feature_dim = 21
-        self.w = [0.0] * (self.feature_dim * len(self.actions))
-        self.policy_probs = {
-            state: {a: 1.0 / len(self.actions) for a in self.actions}
-            for state in self.states
-        }
-        self.policy_probs[self.target_pos] = {a: 0.0 for a in self.actions}
-        self.policy_probs[self.target_pos][5] = 1.0
+        coords = normalized_coords(self.env)
+        params = {"degree": 5} if basis == "polynomial" else {}
+        params.update(basis_params or {})
+        # sparse phi(s) for every state and action-blocked weights: Q(s, a) = W[a] . phi(s)
+        self._init_features(coords, basis, params)
+        # epsilon-greedy w.r.t. the current weights, drawn at action-selection time
+        self.sampler = EpsilonGreedySampler(len(self.actions), self.epsilon, seed)
 
         self.policy = {state: self.actions[0] for state in self.states}
         self.episode_lengths = []
@@ -37,79 +40,36 @@ class SarsaWithFA:
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         self.folder_path = str(project_root / "renders" / "sarsa_with_FA" / f"{self.timestamp}")
 
-    def _phi_s_a(self, state, action):
-        features = []
-
-        x, y = state
-        x = x / (self.grid_size - 1)
-        y = y / (self.grid_size - 1)
-
-        f_state = [
-            1.0,
-            x,
-            y,
-            x**2,
-            y**2,
-            x * y,
-            x**3,
-            y**3,
-            x**2 * y,
-            x * y**2,
-            x**4,
-            y**4,
-            x**3 * y,
-            x**2 * y**2,
-            x * y**3,
-            x**5,
-            y**5,
-            x**4 * y,
-            x**3 * y**2,
-            x**2 * y**3,
-            x * y**4,
-        ]
-        f_zero = [0.0] * len(f_state)
-
-        index = self.actions.index(action)
-        for i, _ in enumerate(self.actions):
-            if i == index:
-                features.extend(f_state)
-            else:
-                features.extend(f_zero)
-
-        return features
-
     def _q_s_a(self, state, action):
-        features = self._phi_s_a(state, action)
-        return sum(self.w[i] * features[i] for i in range(len(self.w)))
+        indices, values = self._active(state)
+        return float(self.W[self.env.action_to_index[action], indices] @ values)
 
     def _choose_action(self, state):
-        probs = self.policy_probs[state]
-        actions = list(probs.keys())
-        weights = [probs[a] for a in actions]
-        return random.choices(actions, weights=weights, k=1)[0]
+        if state == self.target_pos:
+            return 5
+        return self.actions[self.sampler.sample(self._q_s(state))]
 
     def _update_w(self, state, action, reward, next_state, next_action):
-        phi_t = self._phi_s_a(state, action)
-        q_t = self._q_s_a(state, action)
+        """Returns: gradient w.r.t. the active weights of the taken action's row of W"""
+        row = self.env.action_to_index[action]
+        indices, values = self._active(state)
+        q_t = self.W[row, indices] @ values
         q_t1 = 0.0 if self.env.is_target(next_state) else self._q_s_a(next_state, next_action)
         td_error = reward + self.gamma * q_t1 - q_t
 
-        gradient = [td_error * phi for phi in phi_t]
-        for i in range(len(self.w)):
-            self.w[i] += self.alpha * gradient[i]
-        
-        return gradient       
+        # only the taken action's active features are non-zero
+        gradient = td_error * values
+        if self.dense_features:
+            self.W[row] += self.alpha * gradient
+        else:
+            np.add.at(self.W[row], indices, self.alpha * gradient)
 
-    def _update_policy_probs(self, state):
-        q_values = {a: self._q_s_a(state, a) for a in self.actions}
-        max_q = max(q_values.values())
-        best_actions = [a for a, q in q_values.items() if q == max_q]
-        total_best = len(best_actions)
+        return gradient
 
-        for a in self.actions:
-            self.policy_probs[state][a] = self.epsilon / len(self.actions)
-            if a in best_actions:
-                self.policy_probs[state][a] += (1.0 - self.epsilon) / total_best
+    def _target_probs(self, q):
+        """Evaluated policy: epsilon-greedy w.r.t. `q` ([N, n_actions]), ties split evenly."""
+        best = q == q.max(axis=1, keepdims=True)
+        return self.epsilon / len(self.actions) + (1.0 - self.epsilon) * best / best.sum(axis=1, keepdims=True)
 
     def solve(self, n_episodes, max_steps, log_interval=100):
         gradient_records = []  # To store gradients for analysis
@@ -127,7 +87,6 @@ class SarsaWithFA:
 
                 gradient = self._update_w(state_t, action_t, reward, state_t1, action_t1)
                 gradient_records.append(gradient)
-                self._update_policy_probs(state_t)
 
                 state_t, action_t = state_t1, action_t1
                 step += 1
@@ -136,8 +95,7 @@ class SarsaWithFA:
             self.total_rewards.append(reward_sum)
 
             if episode % log_interval == 0:
-                for state in self.states:
-                    self.policy[state] = max(self.policy_probs[state], key=lambda action: self.policy_probs[state][action])
+                self._materialize_policy()
 
                 self.env.render(None, self.policy, folder_path=self.folder_path,
                     title=f'n_episodes={n_episodes}, ' + f'alpha={self.alpha}, ' + f'epsilon={self.epsilon}, ',
@@ -168,6 +126,12 @@ if __name__ == "__main__":
         "n_episodes": 1000,
         "max_steps": 200,
         "log_interval": 100,
+        "basis": "polynomial",  # "polynomial", "fourier", "rbf", "tile" or "hashed_tile"
+        "basis_params": None,  # None: the basis' defaults
+        "solver": "td",  # or "lstd": least-squares fit on a fixed batch of episodes
+        "lstd_episodes": 50,
+        "lstd_iterations": 20,
+        "lstd_method": "batch",  # or "sherman_morrison"
     }
 
     env = GridWorld(
@@ -188,9 +152,19 @@ if __name__ == "__main__":
         gamma=config["gamma"],
         alpha=config["alpha"],
         epsilon=config["epsilon"],
+        basis=config["basis"],
+        basis_params=config["basis_params"],
     )
-    sarsa_fa.solve(
-        n_episodes=config["n_episodes"],
-        max_steps=config["max_steps"],
-        log_interval=config["log_interval"],
-    )
\ No newline at end of file
+    if config["solver"] == "lstd":
+        sarsa_fa.solve_lstd(
+            n_episodes=config["lstd_episodes"],
+            max_steps=config["max_steps"],
+            n_iterations=config["lstd_iterations"],
+            method=config["lstd_method"],
+        )
+    else:
+        sarsa_fa.solve(
+            n_episodes=config["n_episodes"],
+            max_steps=config["max_steps"],
+            log_interval=config["log_interval"],
+        )
\ No newline at end of file